@@ -0,0 +1,162 @@
+import io
+import sys
+import csv
+import math
+import time
+import random
+import argparse
+import itertools
+import contextlib
+import multiprocessing
+from ast import literal_eval
+from maze_sim import *
+
+MAX_ITERATIONS = 20000 # Runs that have not reached the end after this many iterations are stopped.
+PHASES = ('sensors', 'navigate', 'scan', 'junction', 'fast_forward')
+
+# Generate every combination of parameter values, given a dict of parameter names to lists of values.
+def param_combinations(params):
+    if not params:
+        return [{}]
+    names = list(params)
+    return [dict(zip(names, values)) for values in itertools.product(*(params[name] for name in names))]
+
+# Generate the list of runs for every combination of config, parameter values and seed.
+# If maze is a dict of generate_maze() arguments, each run instead simulates a maze generated from its seed.
+def make_runs(configs, params=None, seeds=(0,), sensor_model='raster', max_iterations=MAX_ITERATIONS, maze=None, fast_forward=False):
+    runs = []
+    if maze is not None:
+        configs = ['generated']
+    for config_num, run_params, seed in itertools.product(configs, param_combinations(params), seeds):
+        runs.append({'config': config_num, 'params': run_params, 'seed': seed, 'sensor_model': sensor_model, 'max_iterations': max_iterations, 'maze': maze, 'fast_forward': fast_forward})
+    return runs
+
+# Run a single headless simulation and collect its metrics. Output printed by the simulation is discarded, and
+# errors are recorded in the results (along with the metrics up to the error) rather than raised, so that one bad
+# run does not stop a batch.
+def run_sim(run):
+    result = {'config': run['config'], 'seed': run['seed'], 'sensor_model': run['sensor_model'], 'fast_forward': run['fast_forward']}
+    result.update(run['params'])
+    result.update(run['maze'] or {})
+    result.update({'reached_end': False, 'iterations': 0, 'junctions': 0, 'false_merges': 0, 'missed_merges': 0, 'vertices': 0, 'distance': 0, 'path_length': 0, 'setup_time': 0})
+    result.update({phase + '_time': 0 for phase in PHASES})
+    result.update({'total_time': 0, 'error': ''})
+    random.seed(run['seed'])
+    start = time.perf_counter()
+    sim = None
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            if run['maze'] is not None:
+                maze = generate_maze(run['seed'], **run['maze'])
+                sim = MazeSim(None, False, 1, sensor_model=run['sensor_model'], params=run['params'], maze=maze, fast_forward=run['fast_forward'], seed=run['seed'], max_iterations=run['max_iterations'])
+            else:
+                sim = MazeSim(run['config'], False, 1, sensor_model=run['sensor_model'], params=run['params'], fast_forward=run['fast_forward'], seed=run['seed'], max_iterations=run['max_iterations'])
+            result['setup_time'] = time.perf_counter() - start
+            while sim.iterations < run['max_iterations']:
+                if not sim.update():
+                    result['reached_end'] = True
+                    break
+    except Exception as e:
+        result['error'] = type(e).__name__ + ': ' + str(e)
+    result['total_time'] = time.perf_counter() - start
+    if sim is not None:
+        path = sim.manager.tracker.external_path
+        result['iterations'] = sim.iterations
+        result['junctions'] = sim.junctions
+        result['false_merges'] = sim.false_merges
+        result['missed_merges'] = sim.missed_merges
+        result['vertices'] = len(sim.manager.tracker.a_list)
+        result['distance'] = sim.distance
+        result['path_length'] = sum(math.dist(path[i], path[i + 1]) for i in range(len(path) - 1))
+        for phase in PHASES:
+            result[phase + '_time'] = sim.phase_times[phase]
+    return result
+
+# Rasterise the walls of every config used by a batch, so that forked worker processes share the cached rasters.
+def preload_walls(runs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        for config_num in {run['config'] for run in runs if run['maze'] is None}:
+            try:
+                MazeSim(config_num)
+            except ValueError:
+                pass # Reported by the run itself.
+
+# Run a batch of simulations across a process pool. Returns one result dict per run, in the order of the runs.
+def run_batch(runs, processes=None):
+    preload_walls(runs)
+    with multiprocessing.Pool(processes) as pool:
+        return pool.map(run_sim, runs, chunksize=1)
+
+# Write a list of result dicts to a CSV file, or to stdout if no path is given.
+def write_results(results, path=None):
+    fields = []
+    for result in results:
+        fields.extend(name for name in result if name not in fields)
+    file = open(path, 'w', newline='') if path else sys.stdout
+    try:
+        writer = csv.DictWriter(file, fields)
+        writer.writeheader()
+        writer.writerows(results)
+    finally:
+        if path:
+            file.close()
+
+# Summarise a list of result dicts as one line per config and combination of the named parameters, e.g. to compare
+# the success rate at each noise level. Merge errors are averaged over every run, including those that failed.
+def summarise(results, names=()):
+    lines = []
+    key = lambda result: (result['config'],) + tuple(result[name] for name in names)
+    for group_key in sorted({key(result) for result in results}, key=str):
+        group = [result for result in results if key(result) == group_key]
+        finished = [result for result in group if result['reached_end']]
+        line = 'Config ' + str(group_key[0]) + ''.join(', ' + name + '=' + str(value) for name, value in zip(names, group_key[1:]))
+        line += ': ' + str(len(finished)) + '/' + str(len(group)) + ' reached the end (' + format(len(finished) / len(group), '.0%') + ')'
+        if finished:
+            line += ', mean iterations ' + str(round(sum(result['iterations'] for result in finished) / len(finished)))
+            line += ', mean junctions ' + str(round(sum(result['junctions'] for result in finished) / len(finished), 1))
+        line += ', merge errors per run ' + str(round(sum(result['false_merges'] for result in group) / len(group), 2)) + ' false, ' + str(round(sum(result['missed_merges'] for result in group) / len(group), 2)) + ' missed'
+        lines.append(line)
+    return lines
+
+# Example: python maze_batch.py --configs 1 2 3 --seeds 0-9 --param MIN_DIST 0.2 0.25 0.3 --output results.csv
+# Or with generated mazes: python maze_batch.py --generate 6 4 --loops 2 --seeds 0-99 --output results.csv
+# Or to measure robustness to noise: python maze_batch.py --seeds 0-99 --param SENSOR_NOISE 0 1 2 --output results.csv
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run many headless maze simulations and collect their metrics.')
+    parser.add_argument('--configs', type=int, nargs='+', default=[1, 2, 3])
+    parser.add_argument('--seeds', default='0', help='A single seed, a range such as 0-9, or a comma separated list.')
+    parser.add_argument('--param', nargs='+', action='append', default=[], metavar=('NAME', 'VALUE'), help='A MazeSim parameter and the values to try.')
+    parser.add_argument('--sensor-model', default='raster', choices=['raster', 'distance', 'segments'])
+    parser.add_argument('--max-iterations', type=int, default=MAX_ITERATIONS)
+    parser.add_argument('--fast-forward', action='store_true', help='Skip over the steps between navigation events.')
+    parser.add_argument('--generate', type=float, nargs=2, default=None, metavar=('X_LIM', 'Y_LIM'), help='Simulate mazes of this size generated from each seed instead of the configs.')
+    parser.add_argument('--corridor-width', type=float, default=0.5)
+    parser.add_argument('--junction-density', type=float, default=0.5)
+    parser.add_argument('--loops', type=int, default=0)
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--output', default=None, help='The CSV file to write, otherwise results are written to stdout.')
+    args = parser.parse_args()
+
+    seeds = []
+    for part in args.seeds.split(','):
+        if '-' in part:
+            first, last = part.split('-')
+            seeds.extend(range(int(first), int(last) + 1))
+        else:
+            seeds.append(int(part))
+    params = {}
+    for param in args.param:
+        if len(param) < 2 or param[0] not in MazeSim.MUTABLE_PARAMS:
+            parser.error('--param needs a MazeSim parameter name and at least one value.')
+        params[param[0]] = [literal_eval(value) for value in param[1:]]
+
+    maze = None
+    if args.generate is not None:
+        maze = {'X_LIM': args.generate[0], 'Y_LIM': args.generate[1], 'corridor_width': args.corridor_width, 'junction_density': args.junction_density, 'loops': args.loops}
+    runs = make_runs(args.configs, params, seeds, args.sensor_model, args.max_iterations, maze, args.fast_forward)
+    start = time.perf_counter()
+    results = run_batch(runs, args.processes)
+    write_results(results, args.output)
+    for line in summarise(results, list(params)):
+        print(line, file=sys.stderr)
+    print('Ran ' + str(len(runs)) + ' simulations in ' + str(round(time.perf_counter() - start, 1)) + 's.', file=sys.stderr)
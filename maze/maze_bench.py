@@ -0,0 +1,247 @@
+import io
+import sys
+import json
+import math
+import time
+import random
+import timeit
+import argparse
+import platform
+import contextlib
+import subprocess
+from maze_sim import *
+
+GRID_SIZES = (4, 8, 16, 32) # Side lengths of the square grid graphs benchmarked, in vertices.
+CELL_SIZE = 0.5 # The spacing between grid vertices in metres.
+SCAN_RES = 360
+REPEAT = 5
+MAX_ITERATIONS = 20000 # Simulations that have not reached the end after this many iterations are stopped.
+
+# Time a function, calling it enough times per repeat for a stable measurement. Returns the best and median time per
+# call in seconds, over the repeats.
+def time_call(func, repeat=REPEAT):
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    times = sorted(t / number for t in timer.repeat(repeat, number))
+    return {'best': times[0], 'median': times[len(times) // 2], 'calls': number * repeat}
+
+# Find the position of vertex (i, j) of a grid graph.
+def grid_pos(i, j):
+    return (round(CELL_SIZE/2 + i*CELL_SIZE, 3), round(CELL_SIZE/2 + j*CELL_SIZE, 3))
+
+# Find the edges of a size x size grid graph, in breadth first order from the corner so that each edge starts at a
+# vertex that has already been visited.
+def grid_edges(size):
+    edges = []
+    done = set()
+    seen = {(0, 0)}
+    queue = [(0, 0)]
+    for i, j in queue:
+        for n in ((i + 1, j), (i, j + 1), (i - 1, j), (i, j - 1)):
+            if 0 <= n[0] < size and 0 <= n[1] < size and (n, (i, j)) not in done:
+                edges.append(((i, j), n))
+                done.add(((i, j), n))
+                if n not in seen:
+                    seen.add(n)
+                    queue.append(n)
+    return edges
+
+# Build the tracker for a size x size grid graph by visiting every edge in turn, as the robot would.
+def make_tracker(size, edges=None):
+    tracker = MazeTracker(MazeSim.MIN_DIST)
+    tracker.set_start(grid_pos(0, 0))
+    tracker.set_end(grid_pos(size - 1, size - 1))
+    degree = lambda i, j: (i > 0) + (j > 0) + (i < size - 1) + (j < size - 1)
+    tracker.prev_vertex = tracker.visit_vertex(grid_pos(0, 0), [0] * degree(0, 0), False)
+    for a, b in edges if edges is not None else grid_edges(size):
+        tracker.prev_vertex = grid_pos(*a)
+        tracker.visit_vertex(grid_pos(*b), [0] * degree(*b), False)
+    return tracker
+
+# Benchmark graph searches and updates on grid graphs of growing size.
+def bench_tracker(sizes, repeat):
+    results = []
+    for size in sizes:
+        edges = grid_edges(size)
+        tracker = make_tracker(size, edges)
+        start, end = tracker.start, tracker.end
+        vertices = len(tracker.a_list)
+        with contextlib.redirect_stdout(io.StringIO()):
+            build = time_call(lambda: make_tracker(size, edges), repeat)
+        build = {key: value / len(edges) if key != 'calls' else value for key, value in build.items()}
+        results.append(dict(name='MazeTracker.visit_vertex', size=vertices, **build))
+        results.append(dict(name='MazeTracker.dijkstra', size=vertices, **time_call(lambda: tracker.dijkstra(start), repeat)))
+        results.append(dict(name='MazeTracker.dijkstra_dest', size=vertices, **time_call(lambda: tracker.dijkstra(start, end), repeat)))
+        results.append(dict(name='MazeTracker.a_star', size=vertices, **time_call(lambda: tracker.a_star(start, end), repeat)))
+        rng = random.Random(0)
+        points = [(rng.uniform(0, size*CELL_SIZE), rng.uniform(0, size*CELL_SIZE)) for i in range(100)]
+        find = time_call(lambda: [tracker.find_vertex(p) for p in points], repeat)
+        find = {key: value / len(points) if key != 'calls' else value for key, value in find.items()}
+        results.append(dict(name='MazeTracker.find_vertex', size=vertices, **find))
+        # Move a vertex back and forth, as when a junction is merged with an earlier visit to it.
+        v = grid_pos(size // 2, size // 2)
+        moved = (v[0] + 0.01, v[1])
+        def move_vertex():
+            tracker.replace_vertex(v, moved)
+            tracker.replace_vertex(moved, v)
+        move = time_call(move_vertex, repeat)
+        move = {key: value / 2 if key != 'calls' else value for key, value in move.items()}
+        results.append(dict(name='MazeTracker.replace_vertex', size=vertices, **move))
+        # Move a vertex at the far side of the grid and then find the path from the start to the end, as at a junction
+        # at the edge of the explored region.
+        edge_v = grid_pos(size - 1, size - 2)
+        edge_moved = (edge_v[0] + 0.01, edge_v[1])
+        def move_vertex_path():
+            tracker.replace_vertex(edge_v, edge_moved)
+            tracker.generate_partial_path(end, end)
+            tracker.replace_vertex(edge_moved, edge_v)
+            tracker.generate_partial_path(end, end)
+        move = time_call(move_vertex_path, repeat)
+        move = {key: value / 2 if key != 'calls' else value for key, value in move.items()}
+        results.append(dict(name='MazeTracker.generate_partial_path', size=vertices, **move))
+    return results
+
+# Benchmark painting the bitmap and listing the edges for grid graphs of growing size.
+def bench_bitmap(sizes, repeat):
+    results = []
+    for size in sizes:
+        tracker = make_tracker(size)
+        vertices = len(tracker.a_list)
+        with contextlib.redirect_stdout(io.StringIO()):
+            manager = MazeManager(size*CELL_SIZE, size*CELL_SIZE)
+        manager.tracker = tracker
+        bitmap = manager.bitmap
+        bitmap.set_start(tracker.start)
+        bitmap.set_end(tracker.end)
+        results.append(dict(name='MazeBitmap.update_pixels_full', size=vertices, **time_call(lambda: bitmap.update_pixels(tracker.a_list, full=True), repeat)))
+        # Alternately add and remove a leaf vertex, as when a junction is mapped.
+        leaf = (tracker.start[0] - CELL_SIZE/2, tracker.start[1])
+        def add_remove_leaf():
+            tracker.a_list[leaf] = {tracker.start}
+            tracker.a_list[tracker.start].add(leaf)
+            bitmap.update_pixels(tracker.a_list)
+            del tracker.a_list[leaf]
+            tracker.a_list[tracker.start].remove(leaf)
+            bitmap.update_pixels(tracker.a_list)
+        update = time_call(add_remove_leaf, repeat)
+        update = {key: value / 2 if key != 'calls' else value for key, value in update.items()}
+        results.append(dict(name='MazeBitmap.update_pixels', size=vertices, **update))
+        results.append(dict(name='MazeManager.get_edges', size=vertices, **time_call(manager.get_edges, repeat)))
+    return results
+
+# Benchmark the per-junction calculations that do not depend on the size of the maze.
+def bench_junction(repeat):
+    results = []
+    beacon_tri = BeaconTri(3, 2)
+    beacon_tri.set_beacons([(0, 0), (3, 0), (0, 3)])
+    rng = random.Random(0)
+    readings = []
+    for i in range(20):
+        pos = (rng.uniform(0.1, 2.9), rng.uniform(0.1, 1.9))
+        angles = []
+        for beacon in beacon_tri.beacon_pos:
+            diff = (beacon[0] - pos[0], pos[1] - beacon[1])
+            angles.append((90 - (math.degrees(math.atan2(diff[1], diff[0])) % 360)) % 360)
+        readings.append(angles)
+    find = time_call(lambda: [beacon_tri.find_pos(*angles) for angles in readings], repeat)
+    find = {key: value / len(readings) if key != 'calls' else value for key, value in find.items()}
+    results.append(dict(name='BeaconTri.find_pos', size=1, **find))
+    # A scan with four openings.
+    angles = [int(i / SCAN_RES * 360) for i in range(SCAN_RES)]
+    left = [1000 if any(abs(mod_diff(a, centre, 360)) < 15 for centre in (0, 90, 180, 270)) else 20 for a in angles]
+    right = [1000] * SCAN_RES
+    results.append(dict(name='sonic_cluster.find_link_angles', size=SCAN_RES, **time_call(lambda: find_link_angles(angles, left, right, 0), repeat)))
+    return results
+
+# Benchmark replaying traces of the fixed configs through a fresh MazeManager, which exercises the navigation code as
+# a full run does but without the physics.
+def bench_replay(repeat):
+    results = []
+    for config_num in (1, 2, 3):
+        random.seed(0)
+        trace = record_sim(config_num).get_trace()
+        manager, mismatches = replay_trace(trace)
+        if mismatches:
+            raise ValueError('Incorrect replay of config ' + str(config_num) + '.')
+        results.append(dict(name='replay_trace.config' + str(config_num), size=len(trace['kinds']), **time_call(lambda: replay_trace(trace), repeat)))
+    return results
+
+# Time full simulation runs, on the fixed configs and on generated mazes of growing size. Runs that are stopped
+# before reaching the end are flagged with reached_end, as their times are not comparable with finished runs.
+def bench_sim(maze_sizes, fast_forward):
+    runs = [('config' + str(config_num), config_num, None) for config_num in (1, 2, 3)]
+    runs += [('maze' + format(x, 'g') + 'x' + format(y, 'g'), None, generate_maze(1, x, y)) for x, y in maze_sizes]
+    results = []
+    for name, config_num, maze in runs:
+        random.seed(0)
+        start = time.perf_counter()
+        error = None
+        reached_end = False
+        with contextlib.redirect_stdout(io.StringIO()):
+            sim = MazeSim(config_num, maze=maze, fast_forward=fast_forward, max_iterations=MAX_ITERATIONS)
+            try:
+                while sim.iterations < MAX_ITERATIONS:
+                    if not sim.update():
+                        reached_end = True
+                        break
+            except Exception as e:
+                error = type(e).__name__ + ': ' + str(e)
+        total = time.perf_counter() - start
+        result = {'name': 'MazeSim.' + name, 'size': len(sim.walls), 'total': total, 'iterations': sim.iterations, 'junctions': sim.junctions, 'reached_end': reached_end, 'error': error}
+        result['junction_latency'] = (sim.phase_times['junction'] + sim.phase_times['scan']) / max(1, sim.junctions)
+        result.update({phase + '_time': value for phase, value in sim.phase_times.items()})
+        results.append(result)
+    return results
+
+# Describe the environment the benchmarks ran in.
+def get_meta():
+    meta = {'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform()}
+    try:
+        meta['commit'] = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        meta['commit'] = None
+    return meta
+
+# Compare two sets of results, printing the ratio of new to old times for each benchmark.
+def compare(old, new):
+    old_results = {(result['name'], result['size']): result for result in old['results']}
+    for result in new['results']:
+        key = (result['name'], result['size'])
+        if key not in old_results:
+            continue
+        field = 'best' if 'best' in result else 'total'
+        ratio = result[field] / old_results[key][field] if old_results[key][field] > 0 else math.inf
+        print(key[0].ljust(36) + str(key[1]).rjust(6) + '  ' + format(old_results[key][field], '.3g').rjust(10) + ' -> ' + format(result[field], '.3g').ljust(10) + ' x' + format(ratio, '.2f'))
+
+# Example: python maze_bench.py --output before.json, then python maze_bench.py --compare before.json
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the maze mapping pipeline.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(GRID_SIZES), help='Side lengths of the grid graphs, in vertices.')
+    parser.add_argument('--mazes', type=float, nargs='+', default=[6, 4], help='Sizes of generated mazes to simulate, as X_LIM Y_LIM pairs.')
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    parser.add_argument('--fast-forward', action='store_true', help='Simulate with fast-forward mode.')
+    parser.add_argument('--skip-sim', action='store_true', help='Skip the full simulation runs.')
+    parser.add_argument('--output', default=None, help='The JSON file to write, otherwise results are written to stdout.')
+    parser.add_argument('--compare', default=None, help='A JSON file of earlier results to compare against.')
+    args = parser.parse_args()
+    if len(args.mazes) % 2 != 0:
+        parser.error('--mazes needs X_LIM Y_LIM pairs.')
+
+    results = []
+    for section, run in (('tracker', lambda: bench_tracker(args.sizes, args.repeat)), ('bitmap', lambda: bench_bitmap(args.sizes, args.repeat)), ('junction', lambda: bench_junction(args.repeat)), ('replay', lambda: bench_replay(args.repeat))):
+        print('Benchmarking ' + section + '...', file=sys.stderr)
+        results.extend(run())
+    if not args.skip_sim:
+        print('Benchmarking simulations...', file=sys.stderr)
+        results.extend(bench_sim(list(zip(args.mazes[::2], args.mazes[1::2])), args.fast_forward))
+    output = {'meta': get_meta(), 'results': results}
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(output, file, indent=1)
+    else:
+        json.dump(output, sys.stdout, indent=1)
+        print()
+    if args.compare:
+        with open(args.compare) as file:
+            compare(json.load(file), output)
@@ -1,10 +1,16 @@
+import io
 import math
 import time
+import struct
+import zlib
 import numpy as np
-from enum import Enum
+from enum import IntEnum
 from PIL import Image
+from maze_raster import *
+from maze_tiles import *
 
-class PixelType(Enum):
+# Pixel codes stored in the bitmap's uint8 array.
+class PixelType(IntEnum):
     EMPTY = 0
     START = 1
     END = 2
@@ -12,11 +18,81 @@ class PixelType(Enum):
     PATH = 4
     CLEARED = 5
 
+# Colour of each pixel type, indexed by its code.
+PIXEL_COLOURS = np.array([
+    (0, 0, 0), # EMPTY
+    (0, 255, 0), # START
+    (255, 0, 0), # END
+    (0, 0, 255), # VERTEX
+    (255, 255, 255), # PATH
+    (128, 128, 128), # CLEARED
+], dtype=np.uint8)
+
+# Rank of each pixel type when downsampling, indexed by its code. The highest ranked type in a block is kept.
+PIXEL_PRIORITY = np.array([0, 4, 5, 3, 2, 1], dtype=np.uint8) # EMPTY < CLEARED < PATH < VERTEX < START < END
+PRIORITY_PIXELS = np.argsort(PIXEL_PRIORITY).astype(np.uint8) # The pixel type for each rank.
+
+# Colours of the debug image layers drawn on top of the pixel types.
+WALL_COLOUR = (255, 0, 255)
+TRAIL_COLOUR = (0, 255, 255)
+ROBOT_COLOUR = (0, 0, 255)
+EXTERNAL_PATH_COLOUR = (255, 255, 0)
+
+RLE_HEADER = b'RLE1' # Identifies run-length encoded bitmaps.
+PNG_HEADER = b'\x89PNG' # Identifies PNG encoded bitmaps.
+
+# Encode an (X_PIXELS, Y_PIXELS) array of pixel codes as a compact byte payload.
+# 'rle' gives zlib-compressed runs of identical codes, scanned along y. 'png' gives a greyscale PNG with x horizontal.
+def encode_bitmap(pixels, method='rle'):
+    pixels = np.asarray(pixels, dtype=np.uint8)
+    if method == 'png':
+        buffer = io.BytesIO()
+        Image.fromarray(np.ascontiguousarray(pixels.T), mode='L').save(buffer, format='PNG', optimize=True)
+        return buffer.getvalue()
+    elif method == 'rle':
+        flat = pixels.ravel()
+        starts = np.flatnonzero(np.diff(flat)) + 1 # Indices at which a new run begins.
+        starts = np.concatenate(([0], starts)) if flat.size > 0 else starts
+        lengths = np.diff(np.append(starts, flat.size)).astype('<u4')
+        body = struct.pack('<I', len(starts)) + flat[starts].tobytes() + lengths.tobytes()
+        return RLE_HEADER + struct.pack('<HH', *pixels.shape) + zlib.compress(body, 9)
+    else:
+        raise ValueError('Unknown bitmap encoding: ' + str(method) + '.')
+
+# Decode a payload from encode_bitmap() back into an (X_PIXELS, Y_PIXELS) array of pixel codes.
+def decode_bitmap(data):
+    data = bytes(data)
+    if data.startswith(PNG_HEADER):
+        return np.array(Image.open(io.BytesIO(data)), dtype=np.uint8).T.copy()
+    elif data.startswith(RLE_HEADER):
+        shape = struct.unpack_from('<HH', data, len(RLE_HEADER))
+        body = zlib.decompress(data[len(RLE_HEADER) + 4:])
+        num_runs = struct.unpack_from('<I', body)[0]
+        values = np.frombuffer(body, dtype=np.uint8, count=num_runs, offset=4)
+        lengths = np.frombuffer(body, dtype='<u4', count=num_runs, offset=4 + num_runs)
+        pixels = np.repeat(values, lengths)
+        if pixels.size != shape[0] * shape[1]:
+            raise ValueError('Corrupt bitmap payload.')
+        return pixels.reshape(shape)
+    else:
+        raise ValueError('Unknown bitmap encoding.')
+
+# Downsample an array of pixel codes by an integer factor, keeping the most important pixel type in each block.
+def downsample_pixels(pixels, scale):
+    w, h = -(-pixels.shape[0] // scale), -(-pixels.shape[1] // scale)
+    padded = np.zeros((w * scale, h * scale), dtype=np.uint8)
+    padded[:pixels.shape[0], :pixels.shape[1]] = pixels
+    ranks = PIXEL_PRIORITY[padded].reshape(w, scale, h, scale).max(axis=(1, 3))
+    return PRIORITY_PIXELS[ranks]
+
 # Main class. Instantiate and use in other modules.
 class MazeBitmap:
 
     PIXEL_RES = 0.01 # How many metres a single pixel is.
     WIDTH = 0 # The width of passages in standard units.
+    TILE_SIZE = 64 # The side length of the tiles the bitmap is stored in, in pixels.
+    PYRAMID_LEVELS = 3 # The number of resolutions the bitmap is kept at, including the full resolution.
+    PYRAMID_SCALE = 4 # The downsampling factor between successive resolutions.
 
     def __init__(self, X_LIM, Y_LIM, pp):
         self.X_LIM = X_LIM
@@ -25,204 +101,281 @@ class MazeBitmap:
         self.X_PIXELS = int(self.X_LIM / self.PIXEL_RES) + 1 # The number of pixels in the x direction.
         self.Y_PIXELS = int(self.Y_LIM / self.PIXEL_RES) + 1 # The number of pixels in the y direction.
         self.P_WIDTH = self.WIDTH / self.PIXEL_RES # The width of passages in pixels.
-        self.pixels = [] # The pixel array representing the state of the maze.
-        for i in range(self.X_PIXELS):
-            pixel_row = []
-            for j in range(self.Y_PIXELS):
-                pixel_row.append(PixelType.EMPTY)
-            self.pixels.append(pixel_row)
-        # self.painted_links = [] # Pairs of vertices whose links have already been painted.
-        self.wall_pixels = []
-        self.img_pixels = np.zeros((self.X_PIXELS * self.pp, self.Y_PIXELS * self.pp, 3))
-        self.painted_path = set()
+        # Each layer is only allocated where it has been written to, so memory grows with the explored area.
+        self.grid = TiledGrid((self.X_PIXELS, self.Y_PIXELS), np.uint8, self.TILE_SIZE) # The state of the maze, holding PixelType codes.
+        self.wall_grid = TiledGrid((self.X_PIXELS, self.Y_PIXELS), bool, self.TILE_SIZE) # Pixels covered by the actual walls, for debugging.
+        self.trail_grid = TiledGrid((self.X_PIXELS, self.Y_PIXELS), bool, self.TILE_SIZE) # Pixels covered by the robot's trail.
+        self.painted_links = None # Directed links (pairs of pixels) painted by the last update.
+        # Downsampled copies of the pixel array, with level 0 being the pixel array itself. Only the tiles below changed
+        # level 0 tiles are recomputed, and only once a tile is requested. Each tile records the map version at which
+        # it last changed, so rendered tiles can be cached.
+        self.levels = [self.grid]
+        for level in range(1, self.PYRAMID_LEVELS):
+            scale = self.PYRAMID_SCALE ** level
+            self.levels.append(TiledGrid((-(-self.X_PIXELS // scale), -(-self.Y_PIXELS // scale)), np.uint8, self.TILE_SIZE))
+        self.version = 0 # Incremented whenever the pixel array changes.
+        self.base_version = 0 # The version at the last reset, which untouched tiles share.
+        self.tile_versions = [{} for level in range(self.PYRAMID_LEVELS)] # The version at which each tile last changed.
+        self.pyramid_dirty = set() # Keys of level 0 tiles that have changed since the pyramid was last updated.
+        # The debug image is composed from the layers above and upscaled by pp. It is only allocated once requested,
+        # after which only dirty tiles are recomposed, along with the pixels under the previous frame's overlay.
+        self.img_pixels = None
+        self.dirty_tiles = set() # Keys of the tiles of the debug image that are out of date.
+        self.overlay = (np.zeros(0, dtype=int), np.zeros(0, dtype=int)) # Pixels drawn over in the last frame.
+        self.debug_rects = [] # Regions (x0, y0, x1, y1) of the debug image that changed since get_debug_rects().
     
     # Reset to initial state.
     def reset(self):
-        self.pixels = []
-        for i in range(self.X_PIXELS):
-            pixel_row = []
-            for j in range(self.Y_PIXELS):
-                pixel_row.append(PixelType.EMPTY)
-            self.pixels.append(pixel_row)
-        # self.painted_links = []
-        self.wall_pixels = []
-        self.img_pixels = np.zeros((self.X_PIXELS * self.pp, self.Y_PIXELS * self.pp, self.pp))
-        self.painted_path = set()
+        self.grid.reset()
+        self.wall_grid.reset()
+        self.trail_grid.reset()
+        self.painted_links = None
+        for grid in self.levels:
+            grid.reset()
+        self.version += 1
+        self.base_version = self.version
+        self.tile_versions = [{} for level in range(self.PYRAMID_LEVELS)]
+        self.pyramid_dirty = set()
+        self.img_pixels = None
+        self.dirty_tiles = set()
+        self.overlay = (np.zeros(0, dtype=int), np.zeros(0, dtype=int))
+        self.debug_rects = []
+
+    # The pixel array representing the state of the maze, as a dense array of PixelType codes.
+    @property
+    def pixels(self):
+        return self.grid.to_array()
     
     # Convert a point in metres (standard units) to pixels.
     def to_pixels(self, point):
         return (round(point[0] / self.PIXEL_RES), round(point[1] / self.PIXEL_RES))
 
-    def debug_pixel(self, array, pos, colour):
-        for i in range(self.pp):
-            for j in range(self.pp):
-                array[self.pp*pos[0] + i][self.pp*pos[1] + j] = colour
+    # Mark a region (x0, y0, x1, y1) of the debug image as out of date.
+    def mark_dirty(self, bounds):
+        if self.img_pixels is not None:
+            self.dirty_tiles.update(self.grid.tile_keys(bounds))
+
+    # Record a change to a region (x0, y0, x1, y1) of the pixel array.
+    def mark_changed(self, bounds):
+        self.version += 1
+        keys = self.grid.tile_keys(bounds)
+        for key in keys:
+            self.tile_versions[0][key] = self.version
+        self.pyramid_dirty.update(keys)
+        self.mark_dirty(bounds)
+
+    # Bring the downsampled levels up to date with the tiles of the pixel array that have changed.
+    def update_pyramid(self):
+        dirty = self.pyramid_dirty
+        self.pyramid_dirty = set()
+        for level in range(1, self.PYRAMID_LEVELS):
+            below = self.levels[level - 1]
+            grid = self.levels[level]
+            changed = set()
+            for key in dirty:
+                x0, y0, x1, y1 = below.tile_bounds(key)
+                pixels = downsample_pixels(below.read((x0, y0, x1, y1)), self.PYRAMID_SCALE)
+                bounds = (x0 // self.PYRAMID_SCALE, y0 // self.PYRAMID_SCALE, x0 // self.PYRAMID_SCALE + pixels.shape[0], y0 // self.PYRAMID_SCALE + pixels.shape[1])
+                if grid.write(bounds, pixels):
+                    changed.update(grid.tile_keys(bounds))
+            for key in changed:
+                self.tile_versions[level][key] = self.version
+            dirty = changed
+
+    # Find the number of tiles in the x and y directions at a pyramid level.
+    def get_tile_counts(self, level):
+        shape = self.levels[level].shape
+        return (-(-shape[0] // self.TILE_SIZE), -(-shape[1] // self.TILE_SIZE))
+
+    # Find the map version at which a tile at a pyramid level last changed.
+    def get_tile_version(self, level, tx, ty):
+        self.update_pyramid()
+        return self.tile_versions[level].get((tx, ty), self.base_version)
+
+    # Render a tile at a pyramid level as a PNG, with x horizontal.
+    def render_tile(self, level, tx, ty):
+        counts = self.get_tile_counts(level)
+        if not (0 <= tx < counts[0] and 0 <= ty < counts[1]):
+            raise IndexError('Tile ' + str((level, tx, ty)) + ' is outside the bitmap.')
+        self.update_pyramid()
+        pixels = self.levels[level].read(self.levels[level].tile_bounds((tx, ty)))
+        buffer = io.BytesIO()
+        Image.fromarray(PIXEL_COLOURS[pixels.T]).save(buffer, format='PNG')
+        return buffer.getvalue()
+
+    # View the debug image as an (X_PIXELS, Y_PIXELS, pp, pp, 3) array of upscaled pixels.
+    def debug_blocks(self):
+        return self.img_pixels.reshape(self.X_PIXELS, self.pp, self.Y_PIXELS, self.pp, 3).transpose(0, 2, 1, 3, 4)
+
+    # Combine the colours of the pixel type, wall and trail layers.
+    def layer_colours(self, pixels, walls, trail):
+        colours = PIXEL_COLOURS[pixels]
+        colours[(pixels == PixelType.EMPTY) & walls] = WALL_COLOUR
+        colours[trail] = TRAIL_COLOUR
+        return colours
+
+    # Recompose the dirty tiles of the debug image.
+    def compose(self):
+        if self.img_pixels is None:
+            self.img_pixels = np.zeros((self.X_PIXELS * self.pp, self.Y_PIXELS * self.pp, 3), dtype=np.uint8)
+            self.dirty_tiles = set(self.grid.tiles) | set(self.wall_grid.tiles) | set(self.trail_grid.tiles)
+            self.debug_rects.append((0, 0, self.X_PIXELS, self.Y_PIXELS))
+        blocks = self.debug_blocks()
+        for key in self.dirty_tiles:
+            x0, y0, x1, y1 = bounds = self.grid.tile_bounds(key)
+            colours = self.layer_colours(self.grid.read(bounds), self.wall_grid.read(bounds), self.trail_grid.read(bounds))
+            blocks[x0:x1, y0:y1] = colours[:, :, None, None, :]
+            self.debug_rects.append(bounds)
+        self.dirty_tiles = set()
+
+    # Set a pixel in the pixel array.
+    def set_pixel(self, p, pixel_type):
+        self.grid[p] = pixel_type
+        self.mark_changed((p[0], p[1], p[0] + 1, p[1] + 1))
     
     # Set a starting point.
     def set_start(self, pos):
         self.start = self.to_pixels(pos)
-        self.pixels[self.start[0]][self.start[1]] = PixelType.START
-        self.debug_pixel(self.img_pixels, self.start, (0, 255, 0))
+        self.set_pixel(self.start, PixelType.START)
     
     # Set an end point.
     def set_end(self, pos):
         self.end = self.to_pixels(pos)
-        self.pixels[self.end[0]][self.end[1]] = PixelType.END
-        self.debug_pixel(self.img_pixels, self.end, (255, 0, 0))
+        self.set_pixel(self.end, PixelType.END)
     
-    # Update the pixel array.
-    def update_pixels(self, a_list):
-        # start_time = time.time()
-        for i in range(self.X_PIXELS):
-            for j in range(self.Y_PIXELS):
-                if self.pixels[i][j] in (PixelType.VERTEX, PixelType.PATH, PixelType.CLEARED):
-                    self.pixels[i][j] = PixelType.EMPTY
-                    if (i, j) not in self.painted_path:
-                        self.debug_pixel(self.img_pixels, (i, j), (0, 0, 0))
+    # Find the directed links of an adjacency list in pixel coordinates.
+    def get_links(self, a_list):
+        links = set()
         for v in a_list: # Iterate through vertices.
             for n in a_list[v]: # Iterate through neighbours.
-                # if (v, n) in self.painted_links or (n, v) in self.painted_links: # If this link has already been painted.
-                #     continue
                 if v == n:
                     raise Exception('Self link.')
-                # self.painted_links.append((v, n))
-                p1 = self.to_pixels(v)
-                p2 = self.to_pixels(n)
-                for p in (p1, p2):
-                    if self.pixels[p[0]][p[1]] not in (PixelType.START, PixelType.END):
-                        self.pixels[p[0]][p[1]] = PixelType.VERTEX
-                        if p not in self.painted_path:
-                            self.debug_pixel(self.img_pixels, p, (0, 0, 255))
-                diff = [p2[i] - p1[i] for i in range(2)] # Find the difference vector.
-                p_dist = math.ceil(math.dist(p1, p2)) # Choose the upper bound on the length of the wall.
-                unit_diff = [diff[i] / p_dist for i in range(2)] # Normalise the difference vector to get the direction.
-                current = [p1[0], p1[1]]
-                for i in range(p_dist + 1):
-                    c = [round(x) for x in current]
-                    for j in range(max(0, math.floor(c[0] - self.P_WIDTH/2)), min(math.ceil(c[0] + self.P_WIDTH/2) + 1, self.X_PIXELS)):
-                        for k in range(max(0, math.floor(c[1] - self.P_WIDTH/2)), min(math.ceil(c[1] + self.P_WIDTH/2) + 1, self.Y_PIXELS)):
-                            pixel = self.pixels[j][k]
-                            if pixel not in (PixelType.EMPTY, PixelType.CLEARED): # Only paint over empty space or cleared areas.
-                                pass
-                            elif c == [j, k]:
-                                self.pixels[j][k] = PixelType.PATH # Mark this cell as a path.
-                                if (j, k) not in self.painted_path:
-                                    self.debug_pixel(self.img_pixels, (j, k), (255, 255, 255))
-                            elif math.dist(c, (j, k)) <= self.P_WIDTH/2:
-                                self.pixels[j][k] = PixelType.CLEARED # Mark this cell as cleared.
-                                if (j, k) not in self.painted_path:
-                                    self.debug_pixel(self.img_pixels, (j, k), (128, 128, 128))
-                    current = [current[i] + unit_diff[i] for i in range(2)]
+                links.add((self.to_pixels(v), self.to_pixels(n)))
+        return links
+
+    # Find the region (x0, y0, x1, y1) that painting a link can touch, with exclusive upper bounds.
+    def link_bounds(self, link):
+        (x1, y1), (x2, y2) = link
+        r = math.ceil(self.P_WIDTH/2) + 1
+        return (max(0, min(x1, x2) - r), max(0, min(y1, y2) - r), min(max(x1, x2) + r + 1, self.X_PIXELS), min(max(y1, y2) + r + 1, self.Y_PIXELS))
+
+    # Clear any painted passages within a region.
+    def clear_region(self, bounds):
+        region = self.grid.read(bounds)
+        cleared = np.isin(region, (PixelType.VERTEX, PixelType.PATH, PixelType.CLEARED))
+        region[cleared] = PixelType.EMPTY
+        if self.grid.write(bounds, region):
+            self.mark_changed(bounds)
+
+    # Paint a batch of links, each given as a pair of pixels.
+    def paint_links(self, links):
+        for link in links:
+            for p in link:
+                if self.grid[p] not in (PixelType.START, PixelType.END):
+                    self.set_pixel(p, PixelType.VERTEX)
+        for link in links: # Paint each link over its own region, so that distant links do not touch the tiles between them.
+            bounds, dist = capsule_dist(self.grid.shape, [link], max(self.P_WIDTH/2, 0.5))
+            region = self.grid.read(bounds)
+            paintable = np.isin(region, (PixelType.EMPTY, PixelType.CLEARED)) # Only paint over empty space or cleared areas.
+            path = paintable & (dist <= 0.5) # Pixels along the centre line.
+            cleared = paintable & ~path & (dist <= self.P_WIDTH/2)
+            region[path] = PixelType.PATH # Mark these cells as a path.
+            region[cleared] = PixelType.CLEARED # Mark these cells as cleared.
+            if self.grid.write(bounds, region):
+                self.mark_changed(bounds)
+
+    # Update the pixel array.
+    # By default only the links that changed since the last update are repainted: regions under removed or moved
+    # links are cleared and every remaining link passing through them is painted again. Since vertices take priority
+    # over paths, and paths over cleared areas, the result is the same as a full repaint.
+    def update_pixels(self, a_list, full=False):
+        # start_time = time.time()
+        links = self.get_links(a_list)
+        if full or self.painted_links is None:
+            for key in list(self.grid.tiles): # Only allocated tiles can hold passages.
+                self.clear_region(self.grid.tile_bounds(key))
+            to_paint = links
+        else:
+            dirty = [self.link_bounds(link) for link in self.painted_links - links]
+            for bounds in dirty:
+                self.clear_region(bounds)
+            to_paint = links - self.painted_links
+            for link in links & self.painted_links: # Repaint links overlapping a cleared region.
+                x0, y0, x1, y1 = self.link_bounds(link)
+                for bounds in dirty:
+                    if x0 < bounds[2] and bounds[0] < x1 and y0 < bounds[3] and bounds[1] < y1:
+                        to_paint.add(link)
+                        break
+        self.paint_links(to_paint)
+        self.painted_links = links
         self.prev_a_list = a_list
         # print('Pixel array update time:', round(time.time() - start_time, 3))
     
+    # Convert the pixel array to an RGB image array, indexed (y, x) as PIL expects.
+    def to_colours(self):
+        pixels = self.pixels
+        if pixels.max() >= len(PIXEL_COLOURS):
+            index = np.argwhere(pixels >= len(PIXEL_COLOURS))[0]
+            raise ValueError('Incorrect pixel value: ' + str(pixels[tuple(index)]) + ' at ' + str(tuple(index)) + '.')
+        return PIXEL_COLOURS[pixels.T]
+    
     # Render the pixel array.
     def render_pixels(self):
         # last_time = time.time()
-        image = Image.new('RGB', (self.X_PIXELS, self.Y_PIXELS))
-        img_pixels = image.load()
-        for i in range(image.size[0]):
-            for j in range(image.size[1]):
-                pixel = self.pixels[i][j]
-                if pixel == PixelType.START:
-                    colour = (0, 255, 0)
-                elif pixel == PixelType.END:
-                    colour = (255, 0, 0)
-                # elif (i, j) in self.external_path:
-                #     colour = (0, 0, 255)
-                elif pixel == PixelType.EMPTY:
-                    colour = (0, 0, 0)
-                elif pixel == PixelType.VERTEX:
-                    colour = (0, 0, 255)
-                elif pixel == PixelType.PATH:
-                    colour = (255, 255, 255)
-                elif pixel == PixelType.CLEARED:
-                    colour = (128, 128, 128)
-                else:
-                    raise ValueError('Incorrect pixel value: ' + str(pixel) + ' at ' + str((i, j)) + '.')
-                img_pixels[i, j] = colour
+        image = Image.fromarray(self.to_colours())
         image.show()
         # print('Image rendering time:', round(time.time() - last_time, 3))
     
     def update_walls(self, walls, width):
-        self.wall_pixels = []
-        for wall in walls:
-            p1 = self.to_pixels(wall[0])
-            p2 = self.to_pixels(wall[1])
-            diff = [p2[i] - p1[i] for i in range(2)] # Find the difference vector.
-            p_dist = math.ceil(math.dist(p1, p2)) # Choose the upper bound on the length of the wall.
-            unit_diff = [diff[i] / p_dist for i in range(2)] # Normalise the difference vector to get the direction.
-            current = [p1[0], p1[1]]
-            for i in range(p_dist + 1):
-                c = [round(x) for x in current]
-                for j in range(max(0, math.floor(c[0] - width/self.PIXEL_RES)), min(math.ceil(c[0] + width/self.PIXEL_RES) + 1, self.X_PIXELS)):
-                    for k in range(max(0, math.floor(c[1] - width/self.PIXEL_RES)), min(math.ceil(c[1] + width/self.PIXEL_RES) + 1, self.Y_PIXELS)):
-                        if math.dist(c, (j, k)) <= width/self.PIXEL_RES:
-                            self.wall_pixels.append((j, k))
-                current = [current[i] + unit_diff[i] for i in range(2)]
-        for pos in self.wall_pixels:
-            self.debug_pixel(self.img_pixels, pos, (255, 0, 255))
+        self.wall_grid.reset()
+        self.mark_dirty((0, 0, self.X_PIXELS, self.Y_PIXELS))
+        for wall in walls: # Rasterise each wall over its own region, to keep the wall layer sparse.
+            segment = [self.to_pixels(wall[0]), self.to_pixels(wall[1])]
+            bounds, dist = capsule_dist(self.wall_grid.shape, [segment], width / self.PIXEL_RES)
+            self.wall_grid.write(bounds, self.wall_grid.read(bounds) | (dist <= width / self.PIXEL_RES))
     
     # Render the pixel array, with the actual walls overlaid on top.
     def render_pixels_debug(self, walls, width):
-        image = Image.new('RGB', (self.X_PIXELS, self.Y_PIXELS))
-        img_pixels = image.load()
-        for i in range(image.size[0]):
-            for j in range(image.size[1]):
-                pixel = self.pixels[i][j]
-                # if (i, j) in robot_path:
-                #     colour = (0, 255, 255)
-                # if (i, j) in self.wall_pixels:
-                #     colour = (255, 0, 255)
-                if pixel == PixelType.START:
-                    colour = (0, 255, 0)
-                elif pixel == PixelType.END:
-                    colour = (255, 0, 0)
-                # elif (i, j) in self.external_path:
-                #     colour = (0, 0, 255)
-                elif pixel == PixelType.EMPTY:
-                    colour = (0, 0, 0)
-                elif pixel == PixelType.VERTEX:
-                    colour = (0, 0, 255)
-                elif pixel == PixelType.PATH:
-                    colour = (255, 255, 255)
-                elif pixel == PixelType.CLEARED:
-                    colour = (128, 128, 128)
-                else:
-                    raise ValueError('Incorrect pixel value: ' + str(pixel) + ' at ' + str((i, j)) + '.')
-                img_pixels[i, j] = colour
-        for wall in walls:
-            p1 = self.to_pixels(wall[0])
-            p2 = self.to_pixels(wall[1])
-            diff = [p2[i] - p1[i] for i in range(2)] # Find the difference vector.
-            p_dist = math.ceil(math.dist(p1, p2)) # Choose the upper bound on the length of the wall.
-            unit_diff = [diff[i] / p_dist for i in range(2)] # Normalise the difference vector to get the direction.
-            current = [p1[0], p1[1]]
-            for i in range(p_dist + 1):
-                c = [round(x) for x in current]
-                for j in range(max(0, math.floor(c[0] - width/self.PIXEL_RES)), min(math.ceil(c[0] + width/self.PIXEL_RES) + 1, self.X_PIXELS)):
-                    for k in range(max(0, math.floor(c[1] - width/self.PIXEL_RES)), min(math.ceil(c[1] + width/self.PIXEL_RES) + 1, self.Y_PIXELS)):
-                        if math.dist(c, (j, k)) <= width/self.PIXEL_RES:
-                            img_pixels[j, k] = (255, 0, 255)
-                current = [current[i] + unit_diff[i] for i in range(2)]
+        colours = self.to_colours()
+        colours[wall_mask(self.grid.shape, walls, width, self.PIXEL_RES).T] = WALL_COLOUR
+        image = Image.fromarray(colours)
         image.show()
     
-    # Convert the bitmap into an array of colours.
+    # Add points of the robot's trail that were not passed to get_bitmap_debug(), e.g. when frames are skipped.
+    def add_trail(self, points):
+        for p in points:
+            if 0 <= p[0] < self.X_PIXELS and 0 <= p[1] < self.Y_PIXELS and not self.trail_grid[p]:
+                self.trail_grid[p] = True
+                self.mark_dirty((p[0], p[1], p[0] + 1, p[1] + 1))
+
+    # Get the regions (x0, y0, x1, y1) of the debug image that have changed since the last call, in image pixels, so
+    # that only they need to be redrawn.
+    def get_debug_rects(self):
+        rects = [(x0 * self.pp, y0 * self.pp, x1 * self.pp, y1 * self.pp) for x0, y0, x1, y1 in set(self.debug_rects)]
+        self.debug_rects = []
+        return rects
+
+    # Convert the bitmap into an array of colours, with the robot and the external path drawn on top.
+    # The returned array is reused by the next call, so copy it if it needs to be kept.
     def get_bitmap_debug(self, pos, robot_path, external_path):
-        # for pos in robot_path:
-        #     self.debug_pixel(self.img_pixels, pos, (0, 255, 255))
-        self.debug_pixel(self.img_pixels, pos, (0, 255, 255))
-        self.painted_path.add(pos)
-        foo = np.copy(self.img_pixels)
-        self.debug_pixel(foo, pos, (0, 0, 255))
-        # for pos in robot_path:
-        #     self.debug_pixel(foo, pos, (0, 255, 255))
-        try:
-            for pos in external_path:
-                self.debug_pixel(foo, pos, (255, 255, 0))
-        except:
-            pass
-        return foo
+        self.trail_grid[pos] = True
+        self.mark_dirty((pos[0], pos[1], pos[0] + 1, pos[1] + 1))
+        self.compose()
+        blocks = self.debug_blocks()
+        xs, ys = self.overlay # Restore the pixels under the last overlay.
+        colours = self.layer_colours(self.grid.read_points(xs, ys), self.wall_grid.read_points(xs, ys), self.trail_grid.read_points(xs, ys))
+        blocks[xs, ys] = colours[:, None, None, :]
+        path = np.array(external_path if external_path else [], dtype=int).reshape(-1, 2)
+        path = path[(path[:, 0] >= 0) & (path[:, 0] < self.X_PIXELS) & (path[:, 1] >= 0) & (path[:, 1] < self.Y_PIXELS)]
+        blocks[pos] = ROBOT_COLOUR
+        blocks[path[:, 0], path[:, 1]] = EXTERNAL_PATH_COLOUR
+        # The path is drawn over the robot, so the overlay changes where the path changes and at the robot.
+        changed = set(zip(xs[:-1].tolist(), ys[:-1].tolist())) ^ set(map(tuple, path.tolist()))
+        if len(xs) > 0 and (xs[-1], ys[-1]) != tuple(pos):
+            changed.update(((int(xs[-1]), int(ys[-1])), tuple(pos)))
+        self.debug_rects.extend((x, y, x + 1, y + 1) for x, y in changed)
+        self.overlay = (np.append(path[:, 0], pos[0]), np.append(path[:, 1], pos[1]))
+        return self.img_pixels
 
 if __name__ == '__main__':
     bitmap = MazeBitmap(3, 2)
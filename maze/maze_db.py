@@ -19,10 +19,13 @@ class MazeDB:
     #     dict = {'_id' : str(now), 'bitmap' : maze_bitmap, 'path' : shortest_path}
     #     col.insert_one(dict)
 
-    def add_doc(self, start, end, edges, shortest_path):
+    # The bitmap, if given, is a payload from encode_bitmap() and is stored as BSON binary.
+    def add_doc(self, start, end, edges, shortest_path, bitmap=None):
         col = self.get_c()
         now = datetime.now()
         dict = {'_id' : str(now), 'start' : start, 'end' : end, 'edges' : edges, 'path' : shortest_path}
+        if bitmap != None:
+            dict['bitmap'] = bitmap
         col.insert_one(dict)
 
 if __name__ == '__main__':
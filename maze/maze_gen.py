@@ -0,0 +1,83 @@
+import sys
+import random
+
+# A maze layout, in the wall format used by MazeSim. Walls are ((x0, y0), (x1, y1)) pairs in metres, excluding the
+# boundary walls which MazeSim adds itself.
+class MazeLayout:
+
+    def __init__(self, walls, X_LIM, Y_LIM, start, end):
+        self.walls = walls
+        self.X_LIM = X_LIM
+        self.Y_LIM = Y_LIM
+        self.start = start
+        self.end = end
+
+# Generate a random maze from a seed, on a grid of square cells the width of a corridor.
+# Passages are carved with the growing tree algorithm. junction_density (0 to 1) is the chance of branching off an
+# earlier cell instead of extending the newest passage, so 0 gives long winding corridors and 1 gives many short
+# branches. loops is the number of extra walls removed afterwards, each of which adds a cycle to the maze.
+# The start is the top left cell and the end is the bottom right cell.
+# Not every maze can be mapped: on some seeds, more often with loops, the tracker miscounts the links at a junction and
+# the robot wanders without reaching the end. Runs on generated mazes should be capped at a number of iterations, as
+# maze_batch.py and maze_bench.py do, and runs that stop without reaching the end reported rather than timed.
+def generate_maze(seed=0, X_LIM=3, Y_LIM=2, corridor_width=0.5, junction_density=0.5, loops=0):
+    cols = round(X_LIM / corridor_width)
+    rows = round(Y_LIM / corridor_width)
+    if cols < 1 or rows < 1 or abs(cols * corridor_width - X_LIM) > 1e-9 or abs(rows * corridor_width - Y_LIM) > 1e-9:
+        raise ValueError('Arena size must be a multiple of the corridor width.')
+    if not 0 <= junction_density <= 1:
+        raise ValueError('Junction density must be between 0 and 1.')
+    rng = random.Random(seed)
+
+    # Carve a spanning tree of passages.
+    passages = set() # Pairs of adjacent cells with no wall between them, as (cell, cell) with the smaller cell first.
+    visited = {(0, 0)}
+    active = [(0, 0)]
+    while active:
+        i = rng.randrange(len(active)) if rng.random() < junction_density else len(active) - 1
+        x, y = active[i]
+        neighbours = [n for n in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)) if 0 <= n[0] < cols and 0 <= n[1] < rows and n not in visited]
+        if not neighbours:
+            active.pop(i)
+            continue
+        n = rng.choice(neighbours)
+        passages.add((min((x, y), n), max((x, y), n)))
+        visited.add(n)
+        active.append(n)
+
+    # Remove extra walls to add loops.
+    closed = [((x, y), (x + 1, y)) for x in range(cols - 1) for y in range(rows)] + [((x, y), (x, y + 1)) for x in range(cols) for y in range(rows - 1)]
+    closed = [pair for pair in closed if pair not in passages]
+    passages.update(rng.sample(closed, min(loops, len(closed))))
+
+    # Convert the remaining walls between cells into segments, joining walls that continue in a straight line.
+    walls = []
+    for x in range(1, cols): # Vertical walls at each column boundary.
+        y0 = None
+        for y in range(rows + 1):
+            is_wall = y < rows and ((x - 1, y), (x, y)) not in passages
+            if is_wall and y0 is None:
+                y0 = y
+            elif not is_wall and y0 is not None:
+                walls.append(((round(x * corridor_width, 9), round(y0 * corridor_width, 9)), (round(x * corridor_width, 9), round(y * corridor_width, 9))))
+                y0 = None
+    for y in range(1, rows): # Horizontal walls at each row boundary.
+        x0 = None
+        for x in range(cols + 1):
+            is_wall = x < cols and ((x, y - 1), (x, y)) not in passages
+            if is_wall and x0 is None:
+                x0 = x
+            elif not is_wall and x0 is not None:
+                walls.append(((round(x0 * corridor_width, 9), round(y * corridor_width, 9)), (round(x * corridor_width, 9), round(y * corridor_width, 9))))
+                x0 = None
+
+    start = (corridor_width / 2, corridor_width / 2)
+    end = (X_LIM - corridor_width / 2, Y_LIM - corridor_width / 2)
+    return MazeLayout(walls, X_LIM, Y_LIM, start, end)
+
+# Print the walls of a generated maze, e.g. python maze_gen.py SEED X_LIM Y_LIM LOOPS
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    maze = generate_maze(int(args[0]) if len(args) > 0 else 0, float(args[1]) if len(args) > 1 else 3, float(args[2]) if len(args) > 2 else 2, loops=int(args[3]) if len(args) > 3 else 0)
+    for wall in maze.walls:
+        print(wall)
@@ -189,6 +189,14 @@ class MazeManager:
                 # print('Abandon link delay.')
             return None
 
+    # Update the position estimate for a step in which default_navigate() would return no command without changing
+    # its state, e.g. when a simulation skips ahead to the next junction.
+    def skip_navigate(self, dr_pos, dr_angle):
+        self.update_pos(dr_pos)
+        self.update_angle(dr_angle)
+        if not self.is_discovered:
+            self.tracker.update_partial_path(self.robot_pos)
+
     # Generate a navigation command after a junction has been mapped.
     # Assume that at this point, the robot is facing towards the first beacon.
     # Output turning angle is given in degrees clockwise from north, [-180, 180].
@@ -222,7 +230,7 @@ class MazeManager:
                 print('Finished.')
                 # self.maze_db.add_doc(self.get_bitmap(), self.get_path())
                 if self.send_to_db:
-                    self.maze_db.add_doc(self.bitmap.to_pixels(self.tracker.start), self.bitmap.to_pixels(self.tracker.end), self.get_edges(), self.get_path())
+                    self.maze_db.add_doc(self.bitmap.to_pixels(self.tracker.start), self.bitmap.to_pixels(self.tracker.end), self.get_edges(), self.get_path(), self.get_bitmap_bytes())
                 return 'e'
         
         # Update relevant data structures.
@@ -243,7 +251,7 @@ class MazeManager:
                 print('Finished.')
                 # self.maze_db.add_doc(self.get_bitmap(), self.get_path())
                 if self.send_to_db:
-                    self.maze_db.add_doc(self.bitmap.to_pixels(self.tracker.start), self.bitmap.to_pixels(self.tracker.end), self.get_edges(), self.get_path())
+                    self.maze_db.add_doc(self.bitmap.to_pixels(self.tracker.start), self.bitmap.to_pixels(self.tracker.end), self.get_edges(), self.get_path(), self.get_bitmap_bytes())
                 return 'e'
             else:
                 target_angle = self.tracker.a_star_navigate(v_pos)
@@ -275,27 +283,14 @@ class MazeManager:
     
     # Get the bitmap after calling junction_navigate().
     def get_bitmap(self):
-        temp = []
-        for i in range(self.bitmap.X_PIXELS):
-            row = []
-            for j in range(self.bitmap.Y_PIXELS):
-                pixel = self.bitmap.pixels[i][j]
-                if pixel == PixelType.EMPTY:
-                    row.append(0)
-                elif pixel == PixelType.START:
-                    row.append(1)
-                elif pixel == PixelType.END:
-                    row.append(2)
-                elif pixel == PixelType.VERTEX:
-                    row.append(3)
-                elif pixel == PixelType.PATH:
-                    row.append(4)
-                elif pixel == PixelType.CLEARED:
-                    row.append(5)
-                else:
-                    raise ValueError('Incorrect pixel value.')
-            temp.append(row)
-        return temp
+        pixels = self.bitmap.pixels
+        if pixels.max() > max(PixelType):
+            raise ValueError('Incorrect pixel value.')
+        return pixels.tolist() # Pixel codes match the PixelType values.
+
+    # Get the bitmap as a compact byte payload, for storage and transfer. Decode it with decode_bitmap().
+    def get_bitmap_bytes(self, method='rle'):
+        return encode_bitmap(self.bitmap.pixels, method)
     
     # Get the pairs of vertices in pixel coordinates.
     def get_edges(self):
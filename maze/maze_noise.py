@@ -0,0 +1,27 @@
+import numpy as np
+
+# Draws Gaussian noise with a given standard deviation from a seeded generator. Samples are generated in blocks, so
+# that drawing one costs an array slice rather than a call into the generator.
+class NoiseSource:
+
+    BLOCK_SIZE = 4096 # The number of samples generated at once.
+
+    def __init__(self, std, rng):
+        self.std = std
+        self.rng = rng
+        self.block = np.zeros(0)
+        self.index = 0 # The index of the next unused sample in the block.
+
+    # Draw n samples.
+    def draw(self, n):
+        if self.index + n > len(self.block):
+            self.block = np.concatenate((self.block[self.index:], self.rng.normal(0, self.std, max(n, self.BLOCK_SIZE))))
+            self.index = 0
+        samples = self.block[self.index:self.index + n]
+        self.index += n
+        return samples
+
+# Make a noise source for each standard deviation, each with its own generator derived from the seed so that changing
+# one noise level does not change the samples drawn by the others. A seed of None gives different noise every time.
+def make_noise_sources(stds, seed=None):
+    return [NoiseSource(std, np.random.default_rng(child)) for std, child in zip(stds, np.random.SeedSequence(seed).spawn(len(stds)))]
@@ -0,0 +1,86 @@
+import math
+import heapq
+
+# Keeps the shortest distances from a root vertex to every vertex of a MazeTracker graph up to date as the graph grows,
+# using Lifelong Planning A* without a heuristic. Each vertex has a distance g and a one-step lookahead rhs, the best
+# distance through its neighbours. Changing the graph only changes rhs for the vertices touching the change, and
+# update() then repairs just the vertices whose distances are affected, instead of searching the whole graph again.
+# Vertices are given by ID, and the positions and adjacency lists are shared with the tracker, which reports each
+# change through add_vertex(), add_edge() and move_vertex().
+class IncrementalPaths:
+
+    def __init__(self, positions, adjacency, order):
+        self.positions = positions # The position of each vertex, indexed by ID.
+        self.adjacency = adjacency # The IDs of the neighbours of each vertex, indexed by ID.
+        self.order = order # The order the vertices were added to a_list in, indexed by ID, for breaking ties.
+        self.root = None
+        self.g = [] # The distance of each vertex from the root, indexed by ID.
+        self.rhs = []
+        self.queue = [] # Heap of (key, ID) for the vertices whose g and rhs differ. Entries with an old key are skipped.
+
+    # Recalculate rhs for a vertex from its neighbours, and queue it if it is now inconsistent.
+    def update_vertex(self, i):
+        if i != self.root:
+            pos = self.positions[i]
+            self.rhs[i] = min((self.g[n] + math.dist(self.positions[n], pos) for n in self.adjacency[i]), default=math.inf)
+        if self.g[i] != self.rhs[i]:
+            heapq.heappush(self.queue, (min(self.g[i], self.rhs[i]), i))
+
+    # Add a vertex with no links. The first vertex added is the root.
+    def add_vertex(self, i):
+        self.g.append(math.inf)
+        self.rhs.append(math.inf)
+        if self.root == None:
+            self.root = i
+            self.rhs[i] = 0
+            heapq.heappush(self.queue, (0, i))
+
+    # Called after two vertices have been linked.
+    def add_edge(self, i, j):
+        self.update_vertex(i)
+        self.update_vertex(j)
+
+    # Called after a vertex has been moved, which changes the length of each of its links.
+    def move_vertex(self, i):
+        self.update_vertex(i)
+        for n in self.adjacency[i]:
+            self.update_vertex(n)
+
+    # Repair the distances of the vertices affected by the changes since the last update.
+    def update(self):
+        queue = self.queue
+        g, rhs = self.g, self.rhs
+        while len(queue) > 0:
+            key, i = heapq.heappop(queue)
+            if g[i] == rhs[i] or key != min(g[i], rhs[i]):
+                continue
+            if g[i] > rhs[i]: # The vertex got closer, so it is settled and may bring its neighbours closer.
+                g[i] = rhs[i]
+            else: # The vertex got further away, so it and its neighbours have to be reconsidered.
+                g[i] = math.inf
+                self.update_vertex(i)
+            for n in self.adjacency[i]:
+                self.update_vertex(n)
+
+    # Find the distance from the root to a vertex.
+    def distance(self, i):
+        self.update()
+        return self.g[i]
+
+    # Find the shortest path from the root to a vertex, as a list of IDs. Of the neighbours a vertex could be reached
+    # through, the one Dijkstra's algorithm would settle first is chosen, so the path is the one a fresh search from
+    # the root would find. If the vertex cannot be reached, the path is just the vertex.
+    def path(self, i):
+        self.update()
+        g = self.g
+        path = [i]
+        while i != self.root and g[i] < math.inf:
+            pos = self.positions[i]
+            prev = None
+            for n in self.adjacency[i]:
+                if g[n] < g[i] and g[n] + math.dist(self.positions[n], pos) == g[i] and (prev == None or (g[n], self.order[n]) < (g[prev], self.order[prev])):
+                    prev = n
+            i = prev
+            path.append(i)
+        path.reverse()
+        return path
@@ -0,0 +1,80 @@
+import math
+import numpy as np
+
+BATCH_SIZE = 1 << 21 # The maximum number of segment-pixel distances computed at once.
+
+# Find the bounding region (x0, y0, x1, y1) of a batch of capsules on a grid, with exclusive upper bounds.
+def capsule_bounds(shape, segments, radius):
+    segments = np.asarray(segments, dtype=float).reshape(-1, 2, 2)
+    x0 = max(0, math.floor(segments[:, :, 0].min() - radius))
+    y0 = max(0, math.floor(segments[:, :, 1].min() - radius))
+    x1 = min(shape[0], math.ceil(segments[:, :, 0].max() + radius) + 1)
+    y1 = min(shape[1], math.ceil(segments[:, :, 1].max() + radius) + 1)
+    return (x0, y0, max(x0, x1), max(y0, y1))
+
+# Find the distance from each pixel in a region to the nearest of a batch of segments.
+# Segments are given as an (n, 2, 2) array of endpoint pairs in pixel coordinates.
+def segment_dist(bounds, segments):
+    x0, y0, x1, y1 = bounds
+    px = np.arange(x0, x1, dtype=float)[None, :, None]
+    py = np.arange(y0, y1, dtype=float)[None, None, :]
+    ax = segments[:, 0, 0, None, None]
+    ay = segments[:, 0, 1, None, None]
+    dx = segments[:, 1, 0, None, None] - ax
+    dy = segments[:, 1, 1, None, None] - ay
+    length_sq = dx**2 + dy**2
+    length_sq[length_sq == 0] = 1 # Degenerate segments are treated as points, since t is then always 0.
+    t = np.clip(((px - ax)*dx + (py - ay)*dy) / length_sq, 0, 1) # Position of the closest point along each segment.
+    dist = np.hypot(px - ax - t*dx, py - ay - t*dy)
+    return dist.min(axis=0)
+
+# Rasterise thick line segments ("capsules") onto a grid of the given shape.
+# Segments are pairs of endpoints in pixel coordinates, and the radius is in pixels.
+# Returns the region covered and the distance from each pixel in it to the nearest segment, which is inf for
+# pixels further than the radius from every segment.
+def capsule_dist(shape, segments, radius):
+    segments = np.asarray(segments, dtype=float).reshape(-1, 2, 2)
+    bounds = capsule_bounds(shape, segments, radius)
+    x0, y0, x1, y1 = bounds
+    dist = np.full((x1 - x0, y1 - y0), np.inf)
+    if dist.size == 0:
+        return bounds, dist
+    # Group segments into batches whose combined bounding region is small enough to compute in one go.
+    batch = []
+    batch_bounds = None
+    for segment in segments:
+        seg_bounds = capsule_bounds(shape, segment, radius)
+        if batch:
+            merged = (min(batch_bounds[0], seg_bounds[0]), min(batch_bounds[1], seg_bounds[1]), max(batch_bounds[2], seg_bounds[2]), max(batch_bounds[3], seg_bounds[3]))
+            if (len(batch) + 1) * (merged[2] - merged[0]) * (merged[3] - merged[1]) > BATCH_SIZE:
+                paint_dist(dist, bounds, batch_bounds, np.array(batch))
+                batch = []
+            else:
+                seg_bounds = merged
+        batch.append(segment)
+        batch_bounds = seg_bounds
+    paint_dist(dist, bounds, batch_bounds, np.array(batch))
+    dist[dist > radius] = np.inf
+    return bounds, dist
+
+# Merge the distances to a batch of segments into the distance array of a larger region.
+def paint_dist(dist, bounds, batch_bounds, batch):
+    x0, y0, x1, y1 = batch_bounds
+    if x1 <= x0 or y1 <= y0:
+        return
+    region = dist[x0 - bounds[0]:x1 - bounds[0], y0 - bounds[1]:y1 - bounds[1]]
+    np.minimum(region, segment_dist(batch_bounds, batch), out=region)
+
+# Find the mask of all pixels in a grid of the given shape lying within the radius of any segment.
+def capsule_mask(shape, segments, radius):
+    mask = np.zeros(shape, dtype=bool)
+    if len(segments) == 0:
+        return mask
+    (x0, y0, x1, y1), dist = capsule_dist(shape, segments, radius)
+    mask[x0:x1, y0:y1] = dist <= radius
+    return mask
+
+# Rasterise walls given in metres, returning the mask of pixels within width metres of any wall.
+def wall_mask(shape, walls, width, pixel_res):
+    segments = [[(round(p[0] / pixel_res), round(p[1] / pixel_res)) for p in wall] for wall in walls]
+    return capsule_mask(shape, segments, width / pixel_res)
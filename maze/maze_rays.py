@@ -0,0 +1,136 @@
+import math
+import numpy as np
+from scipy.ndimage import distance_transform_edt
+
+# Split the origin of a batch of rays into x and y arrays, one per ray. The origin is either a single point shared by
+# every ray, or an (n, 2) array with one point per ray.
+def ray_origins(origin, angles):
+    origins = np.broadcast_to(np.asarray(origin, dtype=float), angles.shape + (2,))
+    return origins[:, 0], origins[:, 1]
+
+# Cast a batch of rays from a pixel position against a boolean wall mask, marching one pixel per step.
+# Angles are in degrees clockwise from north (y increases southwards), and the range in steps may be given per ray.
+# The origin may also be given per ray (see ray_origins()).
+# Every step of every ray is computed at once, and the first hit is found with argmax. Pixels outside the grid count
+# as walls. Returns the number of steps before each ray hits a wall, or miss_value if it does not hit within range.
+def cast_rays(walls, origin, angles, max_steps, miss_value=1000):
+    angles = np.radians(np.asarray(angles, dtype=float))
+    max_steps = np.broadcast_to(np.asarray(max_steps, dtype=int), angles.shape)
+    ox, oy = ray_origins(origin, angles)
+    steps = np.arange(max_steps.max(initial=0))
+    xs = np.rint(ox[:, None] + np.sin(angles)[:, None] * steps).astype(int)
+    ys = np.rint(oy[:, None] - np.cos(angles)[:, None] * steps).astype(int)
+    inside = (xs >= 0) & (xs < walls.shape[0]) & (ys >= 0) & (ys < walls.shape[1])
+    hit = ~inside
+    hit[inside] = walls[xs[inside], ys[inside]]
+    hit &= steps < max_steps[:, None]
+    return np.where(hit.any(axis=1), hit.argmax(axis=1), miss_value)
+
+# Find the Euclidean distance in pixels from each pixel to the nearest wall pixel of a boolean wall mask.
+# Pixels outside the grid count as walls, as in cast_rays.
+def wall_distance_field(walls):
+    return distance_transform_edt(np.pad(~walls, 1))[1:-1, 1:-1]
+
+# Cast a batch of rays like cast_rays, but jump along each ray by the distance to the nearest wall instead of
+# marching one pixel at a time. Each iteration checks the next block of steps directly, so rays grazing a wall still
+# advance quickly, then jumps further if the clearance allows it. Jumps leave a margin for the rounding of both the
+# current and next positions, so the result is identical to cast_rays.
+def sphere_trace(dist, origin, angles, max_steps, miss_value=1000, block=16):
+    angles = np.radians(np.asarray(angles, dtype=float))
+    max_steps = np.broadcast_to(np.asarray(max_steps, dtype=int), angles.shape)
+    ox, oy = ray_origins(origin, angles)
+    dx, dy = np.sin(angles), -np.cos(angles)
+    offsets = np.arange(block)
+    steps = np.zeros(angles.shape, dtype=int)
+    result = np.full(angles.shape, miss_value)
+    active = np.flatnonzero(max_steps > 0)
+    while len(active) > 0:
+        ray_steps = steps[active, None] + offsets
+        xs = np.rint(ox[active, None] + dx[active, None] * ray_steps).astype(int)
+        ys = np.rint(oy[active, None] + dy[active, None] * ray_steps).astype(int)
+        inside = (xs >= 0) & (xs < dist.shape[0]) & (ys >= 0) & (ys < dist.shape[1])
+        clearance = np.zeros(xs.shape)
+        clearance[inside] = dist[xs[inside], ys[inside]]
+        hit = (clearance == 0) & (ray_steps < max_steps[active, None])
+        found = hit.any(axis=1)
+        result[active[found]] = ray_steps[found, hit[found].argmax(axis=1)]
+        steps[active] += np.maximum(block, np.floor(clearance[:, 0] - math.sqrt(2))).astype(int)
+        active = active[~found & (steps[active] < max_steps[active])]
+    return result
+
+# Casts rays analytically against wall segments inflated by a radius (capsules), giving sub-pixel distances.
+# Segments are bucketed into a uniform grid, so a batch of rays from one origin only tests the segments near it and
+# the cost does not depend on the map resolution.
+class SegmentRayCaster:
+
+    def __init__(self, walls, radius, cell_size=0.25):
+        self.segments = np.asarray(walls, dtype=float).reshape(-1, 2, 2) # Wall endpoints in metres.
+        self.radius = radius
+        self.cell_size = cell_size
+        self.cells = {} # Indices of the segments whose capsules overlap each grid cell.
+        for i, segment in enumerate(self.segments):
+            lo = np.floor((segment.min(axis=0) - radius) / cell_size).astype(int)
+            hi = np.floor((segment.max(axis=0) + radius) / cell_size).astype(int)
+            for cx in range(lo[0], hi[0] + 1):
+                for cy in range(lo[1], hi[1] + 1):
+                    self.cells.setdefault((cx, cy), []).append(i)
+
+    # Find the indices of segments that could be hit within max_range of any of the origins, given as (x, y) arrays.
+    def nearby_segments(self, ox, oy, max_range):
+        lo = [math.floor((o.min() - max_range) / self.cell_size) for o in (ox, oy)]
+        hi = [math.floor((o.max() + max_range) / self.cell_size) for o in (ox, oy)]
+        found = set()
+        for cx in range(lo[0], hi[0] + 1):
+            for cy in range(lo[1], hi[1] + 1):
+                found.update(self.cells.get((cx, cy), ()))
+        return np.array(sorted(found), dtype=int)
+
+    # Cast a batch of rays from an origin in metres. Angles are in degrees clockwise from north (y increases
+    # southwards), and the range in metres may be given per ray, as may the origin (see ray_origins()). Returns the
+    # distance to the first wall hit by each ray, or miss_value if it does not hit within range.
+    def cast(self, origin, angles, max_range, miss_value=np.inf):
+        angles = np.radians(np.asarray(angles, dtype=float))
+        max_range = np.broadcast_to(np.asarray(max_range, dtype=float), angles.shape)
+        dist = np.full(angles.shape, np.inf)
+        if len(angles) == 0:
+            return dist
+        ox, oy = ray_origins(origin, angles)
+        candidates = self.nearby_segments(ox, oy, max_range.max())
+        if len(candidates) > 0:
+            dx, dy = np.sin(angles)[:, None], -np.cos(angles)[:, None]
+            dist = ray_capsule_dist((ox[:, None], oy[:, None]), dx, dy, self.segments[candidates], self.radius).min(axis=1)
+        return np.where(dist <= max_range, dist, miss_value)
+
+# Find the distance along each ray (rows) to each capsule (columns), or inf if it misses. The ray directions dx, dy
+# are unit column vectors, and the origin is either a single point or a pair of column vectors with one per ray.
+def ray_capsule_dist(origin, dx, dy, segments, radius):
+    ax, ay = segments[:, 0, 0], segments[:, 0, 1]
+    ex, ey = segments[:, 1, 0] - ax, segments[:, 1, 1] - ay
+    length = np.hypot(ex, ey)
+    safe_length = np.where(length > 0, length, 1)
+    nx, ny = -ey / safe_length, ex / safe_length # Unit normals to the segments.
+    best = np.full((dx.shape[0], len(segments)), np.inf)
+    # The end caps of each capsule.
+    for cx, cy in ((ax, ay), (ax + ex, ay + ey)):
+        mx, my = origin[0] - cx, origin[1] - cy
+        b = mx*dx + my*dy
+        c = mx**2 + my**2 - radius**2
+        disc = b**2 - c
+        with np.errstate(invalid='ignore'):
+            t = -b - np.sqrt(disc)
+        t = np.where((disc >= 0) & (t >= 0), t, np.inf)
+        best = np.minimum(best, t)
+    # The two straight sides of each capsule.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        denom = dx*ey - dy*ex
+        for side in (-1, 1):
+            px, py = ax + side*radius*nx - origin[0], ay + side*radius*ny - origin[1]
+            t = (px*ey - py*ex) / denom
+            s = (px*dy - py*dx) / denom
+            t = np.where((denom != 0) & (s >= 0) & (s <= 1) & (t >= 0) & (length > 0), t, np.inf)
+            best = np.minimum(best, t)
+    # Rays starting inside a capsule hit it immediately.
+    rel_x, rel_y = origin[0] - ax, origin[1] - ay
+    u = np.clip((rel_x*ex + rel_y*ey) / safe_length**2, 0, 1)
+    inside = np.hypot(rel_x - u*ex, rel_y - u*ey) <= radius
+    return np.where(inside, 0, best)
@@ -1,12 +1,31 @@
-from enum import Enum
+import time
+import functools
+from enum import IntEnum
 from maze_manager import *
+from maze_rays import *
+from maze_gen import *
+from maze_trace import *
+from maze_noise import *
 
-class PixelType(Enum):
+class PixelType(IntEnum):
     EMPTY = 0
     START = 1
     END = 2
     WALL = 3
 
+# Rasterise a set of walls, given as a tuple of ((x0, y0), (x1, y1)) pairs in metres. Returns the PixelType codes, the
+# wall mask and the wall distance field. Results are cached and shared by every simulation with the same walls, so the
+# arrays are read-only. Worker processes forked after a config has been loaded inherit its cached raster.
+@functools.lru_cache(maxsize=32)
+def wall_raster(walls, shape, width, pixel_res):
+    is_wall = wall_mask(shape, walls, width, pixel_res)
+    pixels = np.zeros(shape, dtype=np.uint8) # Holds PixelType codes.
+    pixels[is_wall] = PixelType.WALL # Mark wall cells as inaccessible.
+    wall_dist = wall_distance_field(is_wall) # Distance in pixels from each pixel to the nearest wall.
+    for array in (pixels, is_wall, wall_dist):
+        array.setflags(write=False)
+    return pixels, is_wall, wall_dist
+
 class MazeSim:
 
     # Mutable parameters.
@@ -14,21 +33,26 @@ class MazeSim:
     SIDE_RANGE = 1 # The range of the side sensors.
     SCAN_RANGE = 1 # The range of the side sensors when scanning.
     SCAN_RES = 360
+    SENSOR_ANGLES = (0, -90, 90) # The directions of the front, left and right sensors relative to the robot.
     LINK_DIST = 0.15
     FORCE_DIST = 0.05
     MIN_DIST = 0.25
+    SENSOR_NOISE = 0 # The standard deviation of the ultrasonic sensor readings that hit a wall, in pixels.
+    BEACON_NOISE = 0 # The standard deviation of the beacon bearings, in degrees.
+    HEADING_NOISE = 0 # The standard deviation of the drift in heading over each update, in degrees.
+    MUTABLE_PARAMS = ('FRONT_RANGE', 'SIDE_RANGE', 'SCAN_RANGE', 'SCAN_RES', 'SENSOR_ANGLES', 'LINK_DIST', 'FORCE_DIST', 'MIN_DIST', 'SENSOR_NOISE', 'BEACON_NOISE', 'HEADING_NOISE')
 
     # Other parameters.
     PIXEL_RES = 0.01 # Metres/pixel
     SPEED = 0.01 # The distance travelled by the robot between each update.
+    FAST_FORWARD_STEPS = 128 # The number of steps looked ahead in fast-forward mode.
+    ALIGN_SWEEP = 16 # The number of headings swept at once when aligning to a wall.
 
     # Convert a point in metres (standard units) to pixels.
     def to_pixels(self, point):
         return (round(point[0] / self.PIXEL_RES), round(point[1] / self.PIXEL_RES))
 
     # Generate a bitmap representing the maze.
-    walls = []
-
     def config1(self):
         self.walls.append(((0.5, 0), (0.5, 1.5)))
         self.walls.append(((0.5, 1.5), (1, 1.5)))
@@ -66,9 +90,29 @@ class MazeSim:
         self.walls.append(((1.5, 1.5), (1.5, 2)))
         self.walls.append(((1.5, 1.5), (2, 2)))
     
-    def __init__(self, config_num, send_to_db=False, cycles=1):
-        
-        if config_num == 1:
+    # sensor_model selects how sensor rays are cast: 'raster' marches them over the wall pixels, 'distance' sphere
+    # traces them over the wall distance field with the same results (faster in open arenas), and 'segments'
+    # intersects them with the wall geometry directly.
+    # params optionally overrides the mutable parameters for this simulation, by name.
+    # maze is an optional MazeLayout (see generate_maze()) to simulate instead of a config, with config_num set to None.
+    # fast_forward skips over the steps between navigation events in one go (see skip_quiet_steps()). It needs a
+    # noiseless simulation, since it predicts the sensor readings ahead of time.
+    # trace records the calls made to the manager, so the run can be replayed without the simulation (see maze_trace).
+    # seed seeds the noise (see SENSOR_NOISE, BEACON_NOISE and HEADING_NOISE), or gives different noise each run if None.
+    # max_iterations optionally limits how far fast-forward mode skips, so that a caller stopping the simulation after
+    # that many iterations never overshoots it.
+    def __init__(self, config_num, send_to_db=False, cycles=1, sensor_model='raster', params=None, maze=None, fast_forward=False, trace=False, seed=None, max_iterations=None):
+
+        if params is not None:
+            for name, value in params.items():
+                if name not in self.MUTABLE_PARAMS:
+                    raise ValueError('Incorrect parameter name: ' + str(name))
+                setattr(self, name, value)
+
+        self.walls = []
+        if maze is not None:
+            self.walls.extend(maze.walls)
+        elif config_num == 1:
             self.config1()
         elif config_num == 2:
             self.config2()
@@ -77,6 +121,14 @@ class MazeSim:
         else:
             raise ValueError('Incorrect config number.')
         self.cycles = cycles
+        self.fast_forward = fast_forward
+        self.max_iterations = max_iterations
+        if fast_forward and (self.SENSOR_NOISE or self.BEACON_NOISE or self.HEADING_NOISE):
+            raise ValueError('Fast-forward mode needs a noiseless simulation.')
+        self.sensor_noise, self.beacon_noise, self.heading_noise = make_noise_sources((self.SENSOR_NOISE, self.BEACON_NOISE, self.HEADING_NOISE), seed)
+        if sensor_model not in ('distance', 'raster', 'segments'):
+            raise ValueError('Incorrect sensor model.')
+        self.sensor_model = sensor_model
 
         self.WALL_WIDTH = 0.08
         self.X_LIM = 3
@@ -84,6 +136,13 @@ class MazeSim:
         self.pp = 3
         self.start = (0.25, 0.25)
         self.end = (2.75, 1.75)
+        self.beacons = [(0, 0), (3, 0), (0, 3)]
+        if maze is not None:
+            self.X_LIM = maze.X_LIM
+            self.Y_LIM = maze.Y_LIM
+            self.start = maze.start
+            self.end = maze.end
+            self.beacons = [(0, 0), (self.X_LIM, 0), (0, self.Y_LIM)]
 
         self.X_PIXELS = int(self.X_LIM / self.PIXEL_RES) + 1 # The number of pixels in the x direction.
         self.Y_PIXELS = int(self.Y_LIM / self.PIXEL_RES) + 1 # The number of pixels in the y direction.
@@ -94,29 +153,10 @@ class MazeSim:
         self.walls.append(((0, self.Y_LIM), (self.X_LIM, self.Y_LIM)))
         self.walls.append(((0, 0), (0, self.Y_LIM)))
 
-        self.pixels = []
-        for i in range(self.X_PIXELS):
-            pixel_row = []
-            for j in range(self.Y_PIXELS):
-                pixel_row.append(PixelType.EMPTY)
-            self.pixels.append(pixel_row)
-        for wall in self.walls:
-            p1 = self.to_pixels(wall[0])
-            p2 = self.to_pixels(wall[1])
-            diff = [p2[i] - p1[i] for i in range(2)] # Find the difference vector.
-            p_dist = math.ceil(math.dist(p1, p2)) # Choose the upper bound on the length of the wall.
-            unit_diff = [diff[i] / p_dist for i in range(2)] # Normalise the difference vector to get the direction.
-            current = [p1[0], p1[1]]
-            for i in range(p_dist + 1):
-                c = [round(x) for x in current]
-                for j in range(max(0, math.floor(c[0] - self.WALL_WIDTH/self.PIXEL_RES)), min(math.ceil(c[0] + self.WALL_WIDTH/self.PIXEL_RES) + 1, self.X_PIXELS)):
-                    for k in range(max(0, math.floor(c[1] - self.WALL_WIDTH/self.PIXEL_RES)), min(math.ceil(c[1] + self.WALL_WIDTH/self.PIXEL_RES) + 1, self.Y_PIXELS)):
-                        pixel = self.pixels[j][k]
-                        if pixel in (PixelType.START, PixelType.END, PixelType.WALL): # Skip over start, end, previously placed walls.
-                            pass
-                        elif math.dist(c, (j, k)) <= self.WALL_WIDTH/self.PIXEL_RES:
-                            self.pixels[j][k] = PixelType.WALL # Mark this cell as inaccessible.
-                current = [current[i] + unit_diff[i] for i in range(2)]
+        walls = tuple((tuple(wall[0]), tuple(wall[1])) for wall in self.walls)
+        self.pixels, self.is_wall, self.wall_dist = wall_raster(walls, (self.X_PIXELS, self.Y_PIXELS), self.WALL_WIDTH, self.PIXEL_RES)
+        if self.sensor_model == 'segments':
+            self.caster = SegmentRayCaster(self.walls, self.WALL_WIDTH)
 
 
         # render_pixels()
@@ -128,7 +168,9 @@ class MazeSim:
         # Set up arena.
         self.manager.set_start(self.start)
         self.manager.set_end(self.end)
-        self.manager.set_beacons([(0, 0), (3, 0), (0, 3)])
+        self.manager.set_beacons(self.beacons)
+        if trace:
+            self.manager = TraceRecorder(self.manager)
 
         # Initialise robot.
         self.pos = [self.start[0], self.start[1]] # Assume robot is initially at start position.
@@ -142,34 +184,193 @@ class MazeSim:
         self.prev_dist_R = 10000
 
         self.iterations = 0
+        self.junctions = 0 # The number of junctions mapped.
+        self.false_merges = 0 # Junctions merged with a vertex other than the one they truly belong to (see check_merge()).
+        self.missed_merges = 0 # Junctions added as a new vertex although they belong to an existing one.
+        self.vertex_pos = {} # The true position of each vertex in the tracker, averaged in the same way as the estimates.
+        self.distance = 0 # The distance travelled by the robot in metres.
+        self.phase_times = {'sensors': 0, 'navigate': 0, 'scan': 0, 'junction': 0, 'fast_forward': 0} # Wall-clock time spent in each phase.
+
+    # Cast a batch of sensor rays from the robot, with ranges in metres. Returns distances in pixels, or 1000 for rays
+    # that do not hit a wall. Each pixel is 1cm anyway.
+    # positions optionally gives an (n, 2) array of robot positions in metres to cast from instead, one per ray.
+    def cast_sensor_rays(self, angles, ranges, positions=None):
+        pos, ppos = self.pos, self.ppos
+        if positions is not None:
+            pos, ppos = positions, np.rint(positions / self.PIXEL_RES)
+        if self.sensor_model == 'segments':
+            dist = self.caster.cast(pos, angles, ranges, 1000 * self.PIXEL_RES) / self.PIXEL_RES
+        else:
+            max_steps = np.round(np.asarray(ranges) / self.PIXEL_RES).astype(int)
+            if self.sensor_model == 'distance':
+                dist = sphere_trace(self.wall_dist, ppos, angles, max_steps)
+            else:
+                dist = cast_rays(self.is_wall, ppos, angles, max_steps)
+        if self.SENSOR_NOISE:
+            dist = np.where(dist < 1000, np.maximum(0, dist + self.sensor_noise.draw(len(dist))), dist)
+        return dist.tolist()
+
+    # Find the distance in metres from a point to the nearest wall, or 0 if the point is inside a wall or outside the
+    # arena.
+    def wall_clearance(self, point):
+        ppoint = self.to_pixels(point)
+        if not (0 <= ppoint[0] < self.X_PIXELS and 0 <= ppoint[1] < self.Y_PIXELS):
+            return 0
+        return float(self.wall_dist[ppoint]) * self.PIXEL_RES
+
+    # Check whether a circular robot of the given radius in metres at a point would touch a wall.
+    def collides(self, point, radius=0):
+        return self.wall_clearance(point) <= radius
+
+    # Simulate the front, left and right ultrasonic sensors.
+    def read_sensors(self):
+        t = time.perf_counter()
+        angles = [(self.angle + add_angle) % 360 for add_angle in self.SENSOR_ANGLES]
+        pixel_dist = self.cast_sensor_rays(angles, (self.FRONT_RANGE, self.SIDE_RANGE, self.SIDE_RANGE))
+        self.phase_times['sensors'] += time.perf_counter() - t
+        return pixel_dist
+
+    # Rotate the robot by step degrees at a time while a side sensor's reading keeps decreasing, to align it with a
+    # wall. sensor is the index of the sensor in SENSOR_ANGLES. Rather than recasting every sensor after each degree,
+    # the side sensor is swept over the next ALIGN_SWEEP headings in one batch, which is then searched for the first
+    # increase. Returns the total rotation.
+    def align_to_wall(self, sensor, step, dist, prev_dist):
+        t = time.perf_counter()
+        total_offset = 0
+        while dist - prev_dist <= 0 and abs(total_offset) < 360:
+            headings = []
+            angle = self.angle
+            for i in range(self.ALIGN_SWEEP):
+                angle = (angle + step) % 360
+                headings.append(angle)
+            readings = self.cast_sensor_rays([(heading + self.SENSOR_ANGLES[sensor]) % 360 for heading in headings], self.SIDE_RANGE)
+            for heading, reading in zip(headings, readings):
+                prev_dist, dist = dist, reading
+                self.angle = heading
+                total_offset += step
+                if dist - prev_dist > 0:
+                    break
+        self.phase_times['sensors'] += time.perf_counter() - t
+        return total_offset
+
+    # Skip the steps before the next navigation event along the current heading in one go. A step is quiet if
+    # default_navigate() would return no command without changing its state, and the robot would not realign itself
+    # to a wall. The sensor readings at the next FAST_FORWARD_STEPS positions are cast in a single batch, and the quiet
+    # steps before the first event are applied at once, leaving the step at the event to be simulated normally.
+    def skip_quiet_steps(self):
+        manager = self.manager
+        if self.iterations == 0 or manager.last_dr_pos is None:
+            return
+        # Leave room in the iteration limit for the step simulated normally after the skip.
+        n = self.FAST_FORWARD_STEPS
+        if self.max_iterations is not None:
+            n = min(n, self.max_iterations - self.iterations - 1)
+        if n <= 0:
+            return
+        t = time.perf_counter()
+
+        # Find the positions along the current heading, accumulated in the same way as update().
+        direction_2 = math.radians((90 - self.angle) % 360)
+        positions = np.empty((n + 1, 2))
+        positions[0] = self.pos
+        positions[1:] = (self.SPEED * math.cos(direction_2), -(self.SPEED * math.sin(direction_2)))
+        positions = np.add.accumulate(positions, axis=0)
+
+        # Readings are only compared with thresholds of 10 and 30 pixels, so shorter rays give the same results.
+        angles = [(self.angle + add_angle) % 360 for add_angle in self.SENSOR_ANGLES]
+        ranges = (min(self.FRONT_RANGE, 10 * self.PIXEL_RES), min(self.SIDE_RANGE, 30 * self.PIXEL_RES), min(self.SIDE_RANGE, 30 * self.PIXEL_RES))
+        pixel_dist = np.array(self.cast_sensor_rays(angles * n, ranges * n, np.repeat(positions[:n], 3, axis=0))).reshape(n, 3)
+        front, left, right = pixel_dist.T
+
+        # Wall alignment only leaves the heading unchanged once it has settled on a wall.
+        left_settled = self.prev_dist_L == -10000 and self.prev_dist_R == 10000
+        right_settled = self.prev_dist_R == -10000 and self.prev_dist_L == 10000
+        quiet = ((left > 10) & (right > 10)) | ((left <= 10) & left_settled) | ((left > 10) & (right <= 10) & right_settled)
+
+        # Apply the thresholds and delays of default_navigate() to the dead reckoning position at each step.
+        front_clear = front >= 10
+        side_clear = (left >= 30) | (right >= 30)
+        quiet &= front_clear
+        if manager.is_force_delay or manager.is_link_delay:
+            robot_pos = [(manager.last_vertex[0] + (x + i*0.001 - manager.last_dr_pos[0]), manager.last_vertex[1] + (y + i*0.001 - manager.last_dr_pos[1])) for (x, y), i in zip(positions[:n].tolist(), range(self.iterations + 1, self.iterations + 1 + n))]
+        if manager.is_forcing:
+            if manager.is_force_delay:
+                quiet &= np.array([math.dist(manager.foo_pos, p) < manager.FORCE_DIST for p in robot_pos])
+            else:
+                quiet &= side_clear
+            quiet &= not manager.is_link_delay
+        elif manager.is_link_delay:
+            quiet &= side_clear & np.array([math.dist(manager.temp_pos, p) < manager.LINK_DIST for p in robot_pos])
+        else:
+            quiet &= ~side_clear
+
+        skip = n if quiet.all() else int(quiet.argmin())
+        if skip > 0:
+            for x, y in positions[:skip].tolist():
+                self.iterations += 1
+                manager.skip_navigate((x + self.iterations*0.001, y + self.iterations*0.001), self.angle + self.iterations*0.01)
+            self.distance += self.SPEED * skip
+            self.pos = positions[skip].tolist()
+            self.ppos = self.to_pixels(self.pos)
+            self.robot_path.extend(map(tuple, np.rint(positions[1:skip + 1] / self.PIXEL_RES).astype(int).tolist()))
+        self.phase_times['fast_forward'] += time.perf_counter() - t
+
+    # Check which vertex the tracker matched the junction just visited to, against the true position of the robot. The
+    # tracker is mirrored with true positions, which is what it would see without noise: a junction joins the start,
+    # the end, the last vertex or the nearest vertex within MIN_DIST, in that order, and a vertex it joins moves to the
+    # average of the two positions. before is the set of vertices before the visit, and last_vertex the previous one.
+    def check_merge(self, before, last_vertex):
+        tracker = self.manager.tracker
+        pos = tuple(self.pos)
+        vertex = tracker.prev_vertex
+        if vertex in before:
+            joined = vertex
+        else:
+            moved = before - tracker.a_list.keys()
+            joined = moved.pop() if moved else None
+
+        near = {v: math.dist(pos, v_pos) for v, v_pos in self.vertex_pos.items() if math.dist(pos, v_pos) <= self.MIN_DIST}
+        if last_vertex is None:
+            expected = None
+        elif math.dist(pos, tracker.start) <= self.MIN_DIST:
+            expected = tracker.start
+        elif math.dist(pos, tracker.end) <= self.MIN_DIST:
+            expected = tracker.end if tracker.end in self.vertex_pos else None
+        elif last_vertex in near:
+            expected = last_vertex
+        else:
+            expected = min(near, key=near.get, default=None)
+
+        if joined is not None and joined != expected:
+            self.false_merges += 1
+        elif joined is None and expected is not None:
+            self.missed_merges += 1
+
+        if joined is None:
+            self.vertex_pos[vertex] = vertex if vertex in (tracker.start, tracker.end) else pos
+        elif joined != vertex:
+            old_pos = self.vertex_pos.pop(joined)
+            self.vertex_pos[vertex] = ((old_pos[0] + pos[0]) / 2, (old_pos[1] + pos[1]) / 2)
 
     def update(self):
 
         for cycle in range(self.cycles):
 
+            if self.fast_forward:
+                self.skip_quiet_steps()
+
             self.iterations += 1
 
-            pixel_dist = [1000, 1000, 1000]
-            sensor_range = (self.FRONT_RANGE, self.SIDE_RANGE, self.SIDE_RANGE)
-            add_angle = (0, -90, 90)
-            for i in range(3):
-                sensor_angle = (self.angle + add_angle[i]) % 360
-                unit_v = (math.sin(math.radians(sensor_angle)), -math.cos(math.radians(sensor_angle)))
-                current = [self.ppos[0], self.ppos[1]]
-                for j in range(round(sensor_range[i]/self.PIXEL_RES)):
-                    p = [round(current[k]) for k in range(2)]
-                    if self.pixels[p[0]][p[1]] == PixelType.WALL:
-                        pixel_dist[i] = j
-                        break
-                    current = [current[k] + unit_v[k] for k in range(2)]
-            # Each pixel is 1cm anyway.
+            pixel_dist = self.read_sensors()
             
             if self.iterations == 1:
                 command = 'j'
             else:
+                t = time.perf_counter()
                 command = self.manager.default_navigate((self.pos[0] + self.iterations*0.001, self.pos[1] + self.iterations*0.001), self.angle + self.iterations*0.01, pixel_dist[0], pixel_dist[1], pixel_dist[2])
                 # command = self.manager.default_navigate((self.pos[0], self.pos[1]), self.angle, pixel_dist[0], pixel_dist[1], pixel_dist[2])
                 # Simulate drift (linear w.r.t. time).
+                self.phase_times['navigate'] += time.perf_counter() - t
 
             if command == 'j':
 
@@ -181,6 +382,8 @@ class MazeSim:
                     diff = (self.manager.beacon_tri.beacon_pos[i][0] - self.pos[0], self.pos[1] - self.manager.beacon_tri.beacon_pos[i][1])
                     arg = (90 - (math.degrees(math.atan2(diff[1], diff[0])) % 360)) % 360
                     beacon_angles.append(arg)
+                if self.BEACON_NOISE:
+                    beacon_angles = ((np.array(beacon_angles) + self.beacon_noise.draw(3)) % 360).tolist()
                 
                 # Simulate turning the robot to face the first beacon.
                 diff = (self.manager.beacon_tri.beacon_pos[0][0] - self.pos[0], self.pos[1] - self.manager.beacon_tri.beacon_pos[0][1])
@@ -190,80 +393,48 @@ class MazeSim:
                 else:
                     self.angle = -theta - 270
 
-                scan_angles = []
-                scan_left = []
-                scan_right = []
-                for i in range(self.SCAN_RES):
-                    scan_angles.append(int(i / self.SCAN_RES * 360))
-                    scan_left.append(1000)
-                    scan_right.append(1000)
-                for i in range(self.SCAN_RES):
-                    left_angle = (self.angle + int(i / self.SCAN_RES * 360) - 90) % 360
-                    unit_v = (math.sin(math.radians(left_angle)), -math.cos(math.radians(left_angle)))
-                    current = [self.ppos[0], self.ppos[1]]
-                    for j in range(round(self.SCAN_RANGE/self.PIXEL_RES)):
-                        p = [round(current[k]) for k in range(2)]
-                        if self.pixels[p[0]][p[1]] == PixelType.WALL:
-                            scan_left[i] = j
-                            break
-                        current = [current[k] + unit_v[k] for k in range(2)]
+                t = time.perf_counter()
+                scan_angles = [int(i / self.SCAN_RES * 360) for i in range(self.SCAN_RES)]
+                left_angles = [(self.angle + scan_angle - 90) % 360 for scan_angle in scan_angles]
+                scan_left = self.cast_sensor_rays(left_angles, self.SCAN_RANGE)
+                scan_right = [1000] * self.SCAN_RES
                 # Each pixel is 1cm anyway.
+                self.phase_times['scan'] += time.perf_counter() - t
 
                 # command = manager.junction_navigate(beacon_angles[0], beacon_angles[1], beacon_angles[2], light_scan)
+                before = set(self.manager.tracker.a_list)
+                last_vertex = self.manager.tracker.prev_vertex
+                t = time.perf_counter()
                 command = self.manager.junction_navigate(beacon_angles[0], beacon_angles[1], beacon_angles[2], scan_angles, scan_left, scan_right)
+                self.phase_times['junction'] += time.perf_counter() - t
+                self.junctions += 1
                 if command[0] == 'e':
                     print('Reached end.')
                     return False
+                self.check_merge(before, last_vertex)
                 rotation = int(command)
                 self.angle += rotation # Apply rotation instantaneously.
             
             if pixel_dist[1] <= 10:
-                total_offset = 0
-                while pixel_dist[1] - self.prev_dist_L <= 0:
-                    self.prev_dist_L = pixel_dist[1]
-                    self.angle += 1
-                    total_offset += 1
-                    self.angle %= 360
-                    for i in range(3):
-                        sensor_angle = (self.angle + add_angle[i]) % 360
-                        unit_v = (math.sin(math.radians(sensor_angle)), -math.cos(math.radians(sensor_angle)))
-                        current = [self.ppos[0], self.ppos[1]]
-                        for j in range(round(sensor_range[i]/self.PIXEL_RES)):
-                            p = [round(current[k]) for k in range(2)]
-                            if self.pixels[p[0]][p[1]] == PixelType.WALL:
-                                pixel_dist[i] = j
-                                break
-                            current = [current[k] + unit_v[k] for k in range(2)]
+                total_offset = self.align_to_wall(1, 1, pixel_dist[1], self.prev_dist_L)
                 # angle -= total_offset * 0.4
                 self.angle %= 360
                 self.prev_dist_L = -10000
                 self.prev_dist_R = 10000
             elif pixel_dist[2] <= 10:
-                total_offset = 0
-                while pixel_dist[2] - self.prev_dist_R <= 0:
-                    self.prev_dist_R = pixel_dist[2]
-                    self.angle -= 1
-                    total_offset -= 1
-                    self.angle %= 360
-                    for i in range(3):
-                        sensor_angle = (self.angle + add_angle[i]) % 360
-                        unit_v = (math.sin(math.radians(sensor_angle)), -math.cos(math.radians(sensor_angle)))
-                        current = [self.ppos[0], self.ppos[1]]
-                        for j in range(round(sensor_range[i]/self.PIXEL_RES)):
-                            p = [round(current[k]) for k in range(2)]
-                            if self.pixels[p[0]][p[1]] == PixelType.WALL:
-                                pixel_dist[i] = j
-                                break
-                            current = [current[k] + unit_v[k] for k in range(2)]
+                total_offset = self.align_to_wall(2, -1, pixel_dist[2], self.prev_dist_R)
                 # angle += total_offset * 0.4
                 self.angle %= 360
                 self.prev_dist_R = -10000
                 self.prev_dist_L = 10000
             
+            if self.HEADING_NOISE:
+                self.angle += float(self.heading_noise.draw(1)[0])
             direction = self.angle
             direction_2 = math.radians((90 - direction) % 360)
             self.pos[0] += self.SPEED * math.cos(direction_2)
             self.pos[1] -= self.SPEED * math.sin(direction_2)
+            self.distance += self.SPEED
             self.ppos = self.to_pixels(self.pos)
             self.robot_path.append((self.ppos[0], self.ppos[1]))
 
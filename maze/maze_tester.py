@@ -1,7 +1,8 @@
 import pygame
 import time
-from enum import Enum
+from enum import IntEnum
 from maze_manager import *
+from maze_rays import *
 
 # Mutable parameters.
 FRONT_RANGE = 1 # The range of the front sensors.
@@ -39,8 +40,9 @@ MIN_DIST = 0.25
 # Other parameters.
 PIXEL_RES = 0.01 # Metres/pixel
 SPEED = 0.01 # The distance travelled by the robot between each update.
+TARGET_FPS = 30 # The rate the display is redrawn at. The simulation runs as fast as possible between frames.
 
-class PixelType(Enum):
+class PixelType(IntEnum):
     EMPTY = 0
     START = 1
     END = 2
@@ -227,30 +229,27 @@ walls.append(((X_LIM, 0), (X_LIM, Y_LIM)))
 walls.append(((0, Y_LIM), (X_LIM, Y_LIM)))
 walls.append(((0, 0), (0, Y_LIM)))
 
-pixels = []
-for i in range(X_PIXELS):
-    pixel_row = []
-    for j in range(Y_PIXELS):
-        pixel_row.append(PixelType.EMPTY)
-    pixels.append(pixel_row)
-for wall in walls:
-    p1 = to_pixels(wall[0])
-    p2 = to_pixels(wall[1])
-    diff = [p2[i] - p1[i] for i in range(2)] # Find the difference vector.
-    p_dist = math.ceil(math.dist(p1, p2)) # Choose the upper bound on the length of the wall.
-    unit_diff = [diff[i] / p_dist for i in range(2)] # Normalise the difference vector to get the direction.
-    current = [p1[0], p1[1]]
-    for i in range(p_dist + 1):
-        c = [round(x) for x in current]
-        for j in range(max(0, math.floor(c[0] - WALL_WIDTH/PIXEL_RES)), min(math.ceil(c[0] + WALL_WIDTH/PIXEL_RES) + 1, X_PIXELS)):
-            for k in range(max(0, math.floor(c[1] - WALL_WIDTH/PIXEL_RES)), min(math.ceil(c[1] + WALL_WIDTH/PIXEL_RES) + 1, Y_PIXELS)):
-                pixel = pixels[j][k]
-                if pixel in (PixelType.START, PixelType.END, PixelType.WALL): # Skip over start, end, previously placed walls.
-                    pass
-                elif math.dist(c, (j, k)) <= WALL_WIDTH/PIXEL_RES:
-                    pixels[j][k] = PixelType.WALL # Mark this cell as inaccessible.
-        current = [current[i] + unit_diff[i] for i in range(2)]
+pixels = np.zeros((X_PIXELS, Y_PIXELS), dtype=np.uint8) # Holds PixelType codes.
+pixels[wall_mask(pixels.shape, walls, WALL_WIDTH, PIXEL_RES)] = PixelType.WALL # Mark wall cells as inaccessible.
+is_wall = pixels == PixelType.WALL
 
+# Simulate the front, left and right ultrasonic sensors. Each pixel is 1cm anyway.
+def read_sensors():
+    sensor_range = (FRONT_RANGE, SIDE_RANGE, SIDE_RANGE)
+    add_angle = (0, -90, 90)
+    angles = [(angle + add_angle[i]) % 360 for i in range(3)]
+    return cast_rays(is_wall, ppos, angles, [round(r/PIXEL_RES) for r in sensor_range]).tolist()
+
+# Redraw the regions of the display that have changed since the last frame. trail holds the robot's positions since
+# the last frame, which are added to the trail before drawing.
+def draw_frame(trail):
+    manager.bitmap.add_trail(trail)
+    img_pixels = manager.bitmap.get_bitmap_debug(ppos, robot_path, manager.get_path())
+    rects = []
+    for x0, y0, x1, y1 in manager.bitmap.get_debug_rects():
+        screen.blit(pygame.surfarray.make_surface(img_pixels[x0:x1, y0:y1]), (x0, y0))
+        rects.append(pygame.Rect(x0, y0, x1 - x0, y1 - y0))
+    pygame.display.update(rects)
 
 # render_pixels()
 
@@ -274,6 +273,8 @@ prev_dist_L = 10000
 prev_dist_R = 10000
 
 iterations = 0
+drawn = 0 # The length of the robot's path when the last frame was drawn.
+next_frame = time.perf_counter()
 
 while True:
 
@@ -313,20 +314,7 @@ while True:
     #             #     light[2] = True
     #             elif dist <= SIDE_RANGE/PIXEL_RES and adj_arg >= 270 - SIDE_ANGLE/2 and adj_arg <= 270 + SIDE_ANGLE/2:
     #                 r = 1000
-    pixel_dist = [1000, 1000, 1000]
-    sensor_range = (FRONT_RANGE, SIDE_RANGE, SIDE_RANGE)
-    add_angle = (0, -90, 90)
-    for i in range(3):
-        sensor_angle = (angle + add_angle[i]) % 360
-        unit_v = (math.sin(math.radians(sensor_angle)), -math.cos(math.radians(sensor_angle)))
-        current = [ppos[0], ppos[1]]
-        for j in range(round(sensor_range[i]/PIXEL_RES)):
-            p = [round(current[k]) for k in range(2)]
-            if pixels[p[0]][p[1]] == PixelType.WALL:
-                pixel_dist[i] = j
-                break
-            current = [current[k] + unit_v[k] for k in range(2)]
-    # Each pixel is 1cm anyway.
+    pixel_dist = read_sensors()
     
     if iterations == 1:
         command = 'j'
@@ -431,16 +419,8 @@ while True:
         #             scan_left[int(left_arg/360 * SCAN_RES)] = 0
         #             right_arg = (arg - angle - 90) % 360
         #             scan_right[int(right_arg/360 * SCAN_RES)] = 0
-        for i in range(SCAN_RES):
-            left_angle = (angle + int(i / SCAN_RES * 360) - 90) % 360
-            unit_v = (math.sin(math.radians(left_angle)), -math.cos(math.radians(left_angle)))
-            current = [ppos[0], ppos[1]]
-            for j in range(round(SCAN_RANGE/PIXEL_RES)):
-                p = [round(current[k]) for k in range(2)]
-                if pixels[p[0]][p[1]] == PixelType.WALL:
-                    scan_left[i] = j
-                    break
-                current = [current[k] + unit_v[k] for k in range(2)]
+        left_angles = [(angle + scan_angle - 90) % 360 for scan_angle in scan_angles]
+        scan_left = cast_rays(is_wall, ppos, left_angles, round(SCAN_RANGE/PIXEL_RES)).tolist()
         # Each pixel is 1cm anyway.
 
         # command = manager.junction_navigate(beacon_angles[0], beacon_angles[1], beacon_angles[2], light_scan)
@@ -468,16 +448,7 @@ while True:
             angle += 1
             total_offset += 1
             angle %= 360
-            for i in range(3):
-                sensor_angle = (angle + add_angle[i]) % 360
-                unit_v = (math.sin(math.radians(sensor_angle)), -math.cos(math.radians(sensor_angle)))
-                current = [ppos[0], ppos[1]]
-                for j in range(round(sensor_range[i]/PIXEL_RES)):
-                    p = [round(current[k]) for k in range(2)]
-                    if pixels[p[0]][p[1]] == PixelType.WALL:
-                        pixel_dist[i] = j
-                        break
-                    current = [current[k] + unit_v[k] for k in range(2)]
+            pixel_dist = read_sensors()
         # angle -= total_offset * 0.4
         angle %= 360
         prev_dist_L = -10000
@@ -489,16 +460,7 @@ while True:
             angle -= 1
             total_offset -= 1
             angle %= 360
-            for i in range(3):
-                sensor_angle = (angle + add_angle[i]) % 360
-                unit_v = (math.sin(math.radians(sensor_angle)), -math.cos(math.radians(sensor_angle)))
-                current = [ppos[0], ppos[1]]
-                for j in range(round(sensor_range[i]/PIXEL_RES)):
-                    p = [round(current[k]) for k in range(2)]
-                    if pixels[p[0]][p[1]] == PixelType.WALL:
-                        pixel_dist[i] = j
-                        break
-                    current = [current[k] + unit_v[k] for k in range(2)]
+            pixel_dist = read_sensors()
         # angle += total_offset * 0.4
         angle %= 360
         prev_dist_R = -10000
@@ -584,14 +546,16 @@ while True:
     # if iterations % 1000 == 0:
     #     manager.bitmap.render_pixels_debug(robot_path, walls, WALL_WIDTH)
     
-    pygame.surfarray.blit_array(screen, manager.bitmap.get_bitmap_debug((ppos[0], ppos[1]), robot_path, manager.get_path()))
-    pygame.display.update()
+    # Only draw once a frame is due, so that drawing does not hold up the simulation.
+    if time.perf_counter() < next_frame:
+        continue
+    draw_frame(robot_path[drawn:])
+    drawn = len(robot_path)
+    next_frame = max(next_frame + 1 / TARGET_FPS, time.perf_counter())
 
     events = pygame.event.get()
-    for event in events:
-        if event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_ESCAPE:
-                pygame.quit()
+    if any(event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE) for event in events):
+        break
 
 pygame.quit()
 manager.bitmap.render_pixels_debug(walls, WALL_WIDTH)
\ No newline at end of file
@@ -0,0 +1,111 @@
+import numpy as np
+
+# A 2D grid stored as square tiles. Tiles are only allocated once a value other than the fill value is written to
+# them, and are freed again once they only hold the fill value, so memory grows with the area actually in use.
+class TiledGrid:
+
+    def __init__(self, shape, dtype, tile_size=64, fill=0):
+        self.shape = (int(shape[0]), int(shape[1]))
+        self.dtype = np.dtype(dtype)
+        self.tile_size = tile_size
+        self.fill = fill
+        self.tiles = {} # Allocated tiles, keyed by (tx, ty).
+
+    # Reset to initial state.
+    def reset(self):
+        self.tiles = {}
+
+    # Find the key of the tile containing a pixel.
+    def tile_key(self, point):
+        return (point[0] // self.tile_size, point[1] // self.tile_size)
+
+    # Find the keys of all tiles overlapping a region (x0, y0, x1, y1), with exclusive upper bounds.
+    def tile_keys(self, bounds):
+        x0, y0, x1, y1 = bounds
+        if x1 <= x0 or y1 <= y0:
+            return []
+        t = self.tile_size
+        return [(tx, ty) for tx in range(x0 // t, (x1 - 1) // t + 1) for ty in range(y0 // t, (y1 - 1) // t + 1)]
+
+    # Find the region of the grid covered by a tile.
+    def tile_bounds(self, key):
+        t = self.tile_size
+        return (key[0] * t, key[1] * t, min((key[0] + 1) * t, self.shape[0]), min((key[1] + 1) * t, self.shape[1]))
+
+    # Find the overlap of a region with a tile, as slices into the region and into the tile.
+    def overlap(self, bounds, key):
+        tx0, ty0, tx1, ty1 = self.tile_bounds(key)
+        x0, x1 = max(bounds[0], tx0), min(bounds[2], tx1)
+        y0, y1 = max(bounds[1], ty0), min(bounds[3], ty1)
+        region = (slice(x0 - bounds[0], x1 - bounds[0]), slice(y0 - bounds[1], y1 - bounds[1]))
+        tile = (slice(x0 - tx0, x1 - tx0), slice(y0 - ty0, y1 - ty0))
+        return region, tile
+
+    def check_point(self, point):
+        if not (0 <= point[0] < self.shape[0] and 0 <= point[1] < self.shape[1]):
+            raise IndexError('Pixel ' + str(tuple(point)) + ' is outside the grid.')
+
+    def __getitem__(self, point):
+        self.check_point(point)
+        tile = self.tiles.get(self.tile_key(point))
+        if tile is None:
+            return self.dtype.type(self.fill)
+        return tile[point[0] % self.tile_size, point[1] % self.tile_size]
+
+    def __setitem__(self, point, value):
+        self.check_point(point)
+        key = self.tile_key(point)
+        tile = self.tiles.get(key)
+        if tile is None:
+            if value == self.fill:
+                return
+            tile = self.tiles[key] = np.full((self.tile_size, self.tile_size), self.fill, dtype=self.dtype)
+        tile[point[0] % self.tile_size, point[1] % self.tile_size] = value
+
+    # Read a region (x0, y0, x1, y1) of the grid into a new array.
+    def read(self, bounds):
+        x0, y0, x1, y1 = bounds
+        out = np.full((max(0, x1 - x0), max(0, y1 - y0)), self.fill, dtype=self.dtype)
+        for key in self.tile_keys(bounds):
+            tile = self.tiles.get(key)
+            if tile is not None:
+                region, part = self.overlap(bounds, key)
+                out[region] = tile[part]
+        return out
+
+    # Write an array into a region (x0, y0, x1, y1) of the grid. Returns whether anything changed.
+    def write(self, bounds, values):
+        changed = False
+        for key in self.tile_keys(bounds):
+            region, part = self.overlap(bounds, key)
+            sub = values[region]
+            tile = self.tiles.get(key)
+            if tile is None:
+                if (sub == self.fill).all():
+                    continue
+                tile = self.tiles[key] = np.full((self.tile_size, self.tile_size), self.fill, dtype=self.dtype)
+            if (tile[part] != sub).any():
+                tile[part] = sub
+                changed = True
+                if (tile == self.fill).all():
+                    del self.tiles[key]
+        return changed
+
+    # Read the values at arrays of pixel coordinates.
+    def read_points(self, xs, ys):
+        out = np.full(len(xs), self.fill, dtype=self.dtype)
+        keys = np.stack((xs // self.tile_size, ys // self.tile_size), axis=-1)
+        for key in {tuple(k) for k in keys.tolist()}:
+            tile = self.tiles.get(key)
+            if tile is not None:
+                selected = (keys[:, 0] == key[0]) & (keys[:, 1] == key[1])
+                out[selected] = tile[xs[selected] % self.tile_size, ys[selected] % self.tile_size]
+        return out
+
+    # Convert the grid into a dense array.
+    def to_array(self):
+        return self.read((0, 0, self.shape[0], self.shape[1]))
+
+    # The number of bytes held by allocated tiles.
+    def nbytes(self):
+        return sum(tile.nbytes for tile in self.tiles.values())
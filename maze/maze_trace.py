@@ -0,0 +1,191 @@
+import io
+import sys
+import json
+import random
+import time
+import argparse
+import contextlib
+import numpy as np
+from maze_manager import *
+
+TRACE_VERSION = 2
+NAVIGATE, SKIP, JUNCTION = 0, 1, 2 # The kinds of call recorded in a trace.
+NAV_COMMANDS = (None, 'j') # The commands default_navigate() can return, indexed by their code in a trace.
+
+# Records the calls made to a MazeManager and the commands it returns, so that a run can be replayed later without the
+# simulation or the rover. Use it in place of the manager: navigation calls are recorded and then forwarded to it,
+# and any other attribute is looked up on the manager itself.
+# Calls are stored in columns, one list per argument, and saved as NumPy arrays. Scans are concatenated, with the
+# offset of each junction's scan stored alongside.
+# The tracker is given its own random number generator, starting from the state of the shared one so that the run is
+# the same as an unrecorded one. The starting state is saved with the trace, so a replay makes the same random choices.
+class TraceRecorder:
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.rng_state = random.getstate()
+        manager.tracker.rng = random.Random()
+        manager.tracker.rng.setstate(self.rng_state)
+        self.kinds = [] # The kind of each call, in order.
+        self.nav_pos = [] # Arguments and commands of default_navigate() calls.
+        self.nav_angle = []
+        self.nav_dist = []
+        self.nav_command = []
+        self.skip_pos = [] # Arguments of skip_navigate() calls.
+        self.skip_angle = []
+        self.junction_beacons = [] # Arguments and commands of junction_navigate() calls.
+        self.scan_offsets = [0]
+        self.scan_angles = []
+        self.scan_left = []
+        self.scan_right = []
+        self.junction_command = []
+
+    def __getattr__(self, name):
+        return getattr(self.manager, name)
+
+    def default_navigate(self, dr_pos, dr_angle, front_dist, left_dist, right_dist):
+        command = self.manager.default_navigate(dr_pos, dr_angle, front_dist, left_dist, right_dist)
+        self.kinds.append(NAVIGATE)
+        self.nav_pos.append(dr_pos)
+        self.nav_angle.append(dr_angle)
+        self.nav_dist.append((front_dist, left_dist, right_dist))
+        self.nav_command.append(NAV_COMMANDS.index(command))
+        return command
+
+    def skip_navigate(self, dr_pos, dr_angle):
+        self.manager.skip_navigate(dr_pos, dr_angle)
+        self.kinds.append(SKIP)
+        self.skip_pos.append(dr_pos)
+        self.skip_angle.append(dr_angle)
+
+    def junction_navigate(self, alpha, beta, gamma, angles, left_dist, right_dist):
+        command = self.manager.junction_navigate(alpha, beta, gamma, angles, left_dist, right_dist)
+        self.kinds.append(JUNCTION)
+        self.junction_beacons.append((alpha, beta, gamma))
+        self.scan_angles.extend(angles)
+        self.scan_left.extend(left_dist)
+        self.scan_right.extend(right_dist)
+        self.scan_offsets.append(len(self.scan_angles))
+        self.junction_command.append(command)
+        return command
+
+    # Describe the arena the manager was set up with, which a replay needs to set up its own manager.
+    def get_meta(self):
+        manager = self.manager
+        return {'version': TRACE_VERSION, 'X_LIM': manager.X_LIM, 'Y_LIM': manager.Y_LIM, 'pp': manager.bitmap.pp, 'LINK_DIST': manager.LINK_DIST, 'FORCE_DIST': manager.FORCE_DIST, 'MIN_DIST': manager.tracker.MIN_DIST, 'start': manager.tracker.start, 'end': manager.tracker.end, 'beacons': manager.beacon_tri.beacon_pos, 'rng_state': self.rng_state}
+
+    # Get the trace as a dict of arrays. Sensor readings keep the type they were recorded with (ints or floats), so
+    # that a replay passes the manager exactly the same values.
+    def get_trace(self):
+        return {
+            'meta': np.array(json.dumps(self.get_meta())),
+            'kinds': np.array(self.kinds, dtype=np.uint8),
+            'nav_pos': np.array(self.nav_pos, dtype=float).reshape(-1, 2),
+            'nav_angle': np.array(self.nav_angle, dtype=float),
+            'nav_dist': np.array(self.nav_dist).reshape(-1, 3),
+            'nav_command': np.array(self.nav_command, dtype=np.uint8),
+            'skip_pos': np.array(self.skip_pos, dtype=float).reshape(-1, 2),
+            'skip_angle': np.array(self.skip_angle, dtype=float),
+            'junction_beacons': np.array(self.junction_beacons, dtype=float).reshape(-1, 3),
+            'scan_offsets': np.array(self.scan_offsets, dtype=np.int64),
+            'scan_angles': np.array(self.scan_angles),
+            'scan_left': np.array(self.scan_left),
+            'scan_right': np.array(self.scan_right),
+            'junction_command': np.array(self.junction_command, dtype=str),
+        }
+
+    # Save the trace to a compressed .npz file.
+    def save(self, path):
+        np.savez_compressed(path, **self.get_trace())
+
+# Load a trace saved by TraceRecorder.save().
+def load_trace(path):
+    with np.load(path) as data:
+        trace = {name: data[name] for name in data.files}
+    if json.loads(str(trace['meta'])).get('version') != TRACE_VERSION:
+        raise ValueError('Incorrect trace version.')
+    return trace
+
+# Set up a fresh MazeManager in the arena a trace was recorded in.
+def trace_manager(trace):
+    meta = json.loads(str(trace['meta']))
+    manager = MazeManager(meta['X_LIM'], meta['Y_LIM'], pp=meta['pp'], LINK_DIST=meta['LINK_DIST'], FORCE_DIST=meta['FORCE_DIST'], MIN_DIST=meta['MIN_DIST'])
+    manager.set_start(tuple(meta['start']))
+    manager.set_end(tuple(meta['end']))
+    manager.set_beacons([tuple(beacon) for beacon in meta['beacons']])
+    version, state, gauss_next = meta['rng_state']
+    manager.tracker.rng = random.Random()
+    manager.tracker.rng.setstate((version, tuple(state), gauss_next))
+    return manager
+
+# Feed the calls in a trace through a fresh MazeManager, checking each command against the recorded one. The arrays
+# are converted back to Python values before the first call, so the loop only calls the manager.
+# Returns the manager and a list of mismatches, each as (call index, recorded command, replayed command).
+def replay_trace(trace, manager=None):
+    if manager is None:
+        manager = trace_manager(trace)
+    nav_args = zip(map(tuple, trace['nav_pos'].tolist()), trace['nav_angle'].tolist(), trace['nav_dist'].tolist(), [NAV_COMMANDS[code] for code in trace['nav_command'].tolist()])
+    skip_args = zip(map(tuple, trace['skip_pos'].tolist()), trace['skip_angle'].tolist())
+    offsets = trace['scan_offsets'].tolist()
+    scans = [tuple(trace[name][offsets[i]:offsets[i + 1]].tolist() for name in ('scan_angles', 'scan_left', 'scan_right')) for i in range(len(offsets) - 1)]
+    junction_args = zip(trace['junction_beacons'].tolist(), scans, trace['junction_command'].tolist())
+    mismatches = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i, kind in enumerate(trace['kinds'].tolist()):
+            if kind == NAVIGATE:
+                dr_pos, dr_angle, dist, expected = next(nav_args)
+                command = manager.default_navigate(dr_pos, dr_angle, *dist)
+            elif kind == SKIP:
+                dr_pos, dr_angle = next(skip_args)
+                manager.skip_navigate(dr_pos, dr_angle)
+                continue
+            else:
+                beacons, scan, expected = next(junction_args)
+                command = manager.junction_navigate(*beacons, *scan)
+            if command != expected:
+                mismatches.append((i, expected, command))
+    return manager, mismatches
+
+# Record a trace of a headless simulation.
+def record_sim(config_num=None, maze=None, sensor_model='raster', fast_forward=False, max_iterations=20000):
+    from maze_sim import MazeSim
+    with contextlib.redirect_stdout(io.StringIO()):
+        sim = MazeSim(config_num, sensor_model=sensor_model, maze=maze, fast_forward=fast_forward, trace=True, max_iterations=max_iterations)
+        while sim.iterations < max_iterations and sim.update():
+            pass
+    return sim.manager
+
+# Example: python maze_trace.py record config1.npz --config 1, then python maze_trace.py replay config1.npz
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Record and replay traces of the calls made to a MazeManager.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    record = commands.add_parser('record', help='Record a trace of a headless simulation.')
+    record.add_argument('path')
+    record.add_argument('--config', type=int, default=1)
+    record.add_argument('--generate', type=float, nargs=2, default=None, metavar=('X_LIM', 'Y_LIM'), help='Simulate a generated maze of this size instead of the config.')
+    record.add_argument('--seed', type=int, default=0)
+    record.add_argument('--sensor-model', default='raster', choices=['raster', 'distance', 'segments'])
+    record.add_argument('--fast-forward', action='store_true')
+    replay = commands.add_parser('replay', help='Replay a trace and check the commands match.')
+    replay.add_argument('path')
+    replay.add_argument('--repeat', type=int, default=1, help='The number of times to replay the trace, for profiling.')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        from maze_gen import generate_maze
+        random.seed(args.seed)
+        maze = generate_maze(args.seed, *args.generate) if args.generate else None
+        recorder = record_sim(None if maze else args.config, maze, args.sensor_model, args.fast_forward)
+        recorder.save(args.path)
+        print('Recorded ' + str(len(recorder.kinds)) + ' calls, ' + str(len(recorder.junction_command)) + ' at junctions.')
+    else:
+        trace = load_trace(args.path)
+        best = None
+        for i in range(args.repeat):
+            start = time.perf_counter()
+            manager, mismatches = replay_trace(trace)
+            best = min(best or math.inf, time.perf_counter() - start)
+        for i, expected, command in mismatches:
+            print('Call ' + str(i) + ': recorded ' + repr(expected) + ', replayed ' + repr(command))
+        print('Replayed ' + str(len(trace['kinds'])) + ' calls in ' + format(best, '.3g') + 's, ' + str(len(mismatches)) + ' mismatches.')
+        sys.exit(1 if mismatches else 0)
@@ -2,16 +2,28 @@ import math
 import time
 import random
 import heapq
+from maze_paths import *
 
 # Main class. Instantiate and use in other modules.
 class MazeTracker:
 
-    def __init__(self, MIN_DIST):
+    def __init__(self, MIN_DIST, rng=None):
         self.MIN_DIST = MIN_DIST # The minimum distance between two vertices in metres.
-        self.a_list = {} # Adjacency list to store the maze graph. Vertices are stored by their positions.
+        self.rng = rng if rng != None else random # Picks a direction when there is no better choice. Defaults to the shared generator.
+        # The maze graph is stored by vertex ID. IDs stay the same when a vertex is moved, so moving one only changes
+        # its position, and only its neighbours' links need updating in a_list.
+        self.ids = {} # The ID of the vertex at each position.
+        self.positions = [] # The position of each vertex, indexed by ID.
+        self.adjacency = [] # The IDs of the neighbours of each vertex, indexed by ID.
+        self.a_list = {} # Adjacency list of the maze graph by vertex position, for path finding and display.
+        self.grid = {} # The IDs of the vertices in each MIN_DIST square cell, so that nearby vertices can be found quickly.
         # self.marks = {} # A mapping from vertex positions to lists of link marks.
-        self.num_links = {} # The total number of links for each vertex.
-        self.explored_links = {} # The number of explored links for each vertex.
+        self.num_links = [] # The total number of links for each vertex, indexed by ID.
+        self.explored_links = [] # The number of explored links for each vertex, indexed by ID.
+        self.frontier = set() # The IDs of the vertices with unexplored links.
+        self.order = [] # When each vertex was last added to a_list, indexed by ID, which gives the order of a_list.
+        self.next_order = 0
+        self.paths = IncrementalPaths(self.positions, self.adjacency, self.order) # Shortest distances from the start.
         self.prev_vertex = None # The position of the last vertex reached.
         self.start = None # Start position.
         self.end = None # End position.
@@ -19,21 +31,27 @@ class MazeTracker:
         # When the robot is still traversing the maze, this is the shortest path from the start to the robot.
         # When the robot has reached the end and has surveyed the entire maze, this is the shortest path from start to end.
         self.prev_entry_link = None
-        self.pp_tree = None
         self.pp_next = None
     
     # Reset to initial state.
     def reset(self):
+        self.ids = {}
+        self.positions = []
+        self.adjacency = []
         self.a_list = {}
+        self.grid = {}
         # self.marks = {}
-        self.num_links = {}
-        self.explored_links = {}
+        self.num_links = []
+        self.explored_links = []
+        self.frontier = set()
+        self.order = []
+        self.next_order = 0
+        self.paths = IncrementalPaths(self.positions, self.adjacency, self.order)
         self.prev_vertex = None
         self.start = None
         self.end = None
         self.external_path = []
         self.prev_entry_link = None
-        self.pp_tree = None
         self.pp_next = None
     
     # Finds the difference between two numbers in modular arithmetic.
@@ -72,39 +90,46 @@ class MazeTracker:
         self.end = pos
     
     # Find the distance tree from the given source vertex (and optinally an end vertex) using Dijkstra's algorithm.
-    def dijkstra(self, source, dest=None):
+    # The search stops early once dest is reached, or once the nearest of an optional collection of targets is reached,
+    # and the path returned is the shortest path to it. Distances of vertices not yet settled at that point are
+    # tentative (or inf).
+    # Vertices are settled from a heap, with ties going to the vertex added to a_list first, which is the order a linear
+    # scan of the unvisited vertices would settle them in.
+    def dijkstra(self, source, dest=None, targets=None):
+        if dest != None:
+            targets = {dest}
         # Construct helper objects.
-        distance = {}
-        prev = {}
-        unvisited = []
-        for vertex in self.a_list:
-            distance[vertex] = math.inf
-            prev[vertex] = None
-            unvisited.append(vertex)
+        distance = dict.fromkeys(self.a_list, math.inf)
+        prev = dict.fromkeys(self.a_list)
+        order = {vertex: i for i, vertex in enumerate(self.a_list)}
+        visited = set()
         # Construct shortest-distance tree.
         distance[source] = 0
-        while len(unvisited) > 0:
-            current = unvisited[0]
-            for vertex in unvisited:
-                if distance[vertex] < distance[current]:
-                    current = vertex
-            if dest != None and current == dest:
+        queue = [(0, order[source], source)] if source in order else []
+        reached = None
+        while len(queue) > 0:
+            current_dist, i, current = heapq.heappop(queue)
+            if current in visited:
+                continue
+            if targets != None and current in targets:
+                reached = current
                 break
-            unvisited.remove(current)
+            visited.add(current)
             for neighbour in self.a_list[current]:
-                if neighbour not in unvisited:
+                if neighbour in visited:
                     continue
                 alt_dist = distance[current] + math.dist(current, neighbour)
                 if alt_dist < distance[neighbour]:
                     distance[neighbour] = alt_dist
                     prev[neighbour] = current
+                    heapq.heappush(queue, (alt_dist, order[neighbour], neighbour))
         # Determine shortest path to end node.
         shortest_path = []
-        if dest != None:
-            node = dest
-            while node != None:
-                shortest_path.insert(0, node)
-                node = prev[node]
+        node = dest if dest != None else reached
+        while node != None:
+            shortest_path.append(node)
+            node = prev[node]
+        shortest_path.reverse()
         return distance, shortest_path, prev
 
     def a_star(self, source, dest):
@@ -145,36 +170,96 @@ class MazeTracker:
             current = prev[current]
         return path
     
+    # Find the grid cell containing a position.
+    def grid_cell(self, pos):
+        return (math.floor(pos[0] / self.MIN_DIST), math.floor(pos[1] / self.MIN_DIST))
+
+    # Add a vertex at a position, with the total number of links and the number explored so far. Returns its ID.
+    def add_vertex(self, v, num_links, explored_links=0):
+        i = len(self.positions)
+        self.ids[v] = i
+        self.positions.append(v)
+        self.adjacency.append(set())
+        self.a_list[v] = set()
+        self.num_links.append(num_links)
+        self.explored_links.append(explored_links)
+        self.update_frontier(i)
+        self.grid.setdefault(self.grid_cell(v), []).append(i)
+        self.order.append(self.next_order)
+        self.next_order += 1
+        self.paths.add_vertex(i)
+        return i
+
+    # Link two vertices, given by position.
+    def add_edge(self, u, v):
+        self.a_list[u].add(v)
+        self.a_list[v].add(u)
+        self.adjacency[self.ids[u]].add(self.ids[v])
+        self.adjacency[self.ids[v]].add(self.ids[u])
+        self.paths.add_edge(self.ids[u], self.ids[v])
+
+    # Keep a vertex, given by ID, in the frontier while it has links that have not been explored yet.
+    def update_frontier(self, i):
+        if self.explored_links[i] < self.num_links[i]:
+            self.frontier.add(i)
+        else:
+            self.frontier.discard(i)
+
+    # Count one more explored link for a vertex, given by ID.
+    def explore_link(self, i):
+        self.explored_links[i] += 1
+        self.update_frontier(i)
+
     # Try to find a vertex near enough to the given position.
+    # Only the cells overlapping a square of side 2*MIN_DIST around the position are searched (allowing a little for
+    # rounding). If several vertices are equally close, the one added to a_list first is chosen.
     def find_vertex(self, pos):
+        margin = self.MIN_DIST + 1e-9
+        lo = self.grid_cell((pos[0] - margin, pos[1] - margin))
+        hi = self.grid_cell((pos[0] + margin, pos[1] + margin))
         closest_dist = math.inf
-        closest_v = None
-        for v in self.a_list:
-            dist = math.dist(v, pos)
-            if dist <= self.MIN_DIST and dist < closest_dist:
-                closest_dist = dist
-                closest_v = v
-        return closest_v
+        closest = []
+        for cx in range(lo[0], hi[0] + 1):
+            for cy in range(lo[1], hi[1] + 1):
+                for i in self.grid.get((cx, cy), ()):
+                    v = self.positions[i]
+                    dist = math.dist(v, pos)
+                    if dist <= self.MIN_DIST and dist < closest_dist:
+                        closest_dist = dist
+                        closest = [v]
+                    elif dist == closest_dist:
+                        closest.append(v)
+        if len(closest) > 1:
+            return next(v for v in self.a_list if v in closest)
+        return closest[0] if closest else None
     
-    # Replace all instances of one vertex with another.
+    # Move a vertex to a new position. It keeps its ID, so only the links of its neighbours in a_list change.
     def replace_vertex(self, old_v, new_v):
+        i = self.ids.pop(old_v)
+        self.ids[new_v] = i
+        self.positions[i] = new_v
+        old_cell = self.grid[self.grid_cell(old_v)]
+        old_cell.remove(i)
+        if not old_cell:
+            del self.grid[self.grid_cell(old_v)]
+        self.grid.setdefault(self.grid_cell(new_v), []).append(i)
         self.a_list[new_v] = self.a_list.pop(old_v)
-        self.num_links[new_v] = self.num_links.pop(old_v)
-        self.explored_links[new_v] = self.explored_links.pop(old_v)
-        for v in self.a_list:
-            if old_v in self.a_list[v]:
-                self.a_list[v].remove(old_v)
-                self.a_list[v].add(new_v)
+        self.order[i] = self.next_order
+        self.next_order += 1
+        for n in self.adjacency[i]:
+            neighbours = self.a_list[self.positions[n]]
+            neighbours.remove(old_v)
+            neighbours.add(new_v)
+        self.paths.move_vertex(i)
 
     # Visit a vertex, updating the relevant graph structures.
     # Assume all angles are taken clockwise from north in the range [0, 360].
     def visit_vertex(self, pos, link_angles, is_discovered):
         if self.prev_vertex == None: # If we are at the first iteration.
-            self.a_list[self.start] = set()
-            self.num_links[self.start] = len(link_angles)
-            self.explored_links[self.start] = 0
+            self.add_vertex(self.start, len(link_angles))
             return self.start
         last_vertex = self.prev_vertex
+        last_id = self.ids[last_vertex]
         # b = math.dist(pos, self.prev_vertex)
         # dist = b
         # for v in self.a_list:
@@ -190,25 +275,21 @@ class MazeTracker:
         if math.dist(pos, self.start) <= self.MIN_DIST:
             if last_vertex != self.start:
                 if last_vertex not in self.a_list[self.start]:
-                    self.explored_links[self.start] += 1
-                    self.explored_links[last_vertex] += 1
-                self.a_list[last_vertex].add(self.start)
-                self.a_list[self.start].add(last_vertex)
+                    self.explore_link(self.ids[self.start])
+                    self.explore_link(last_id)
+                self.add_edge(last_vertex, self.start)
             return self.start
         elif math.dist(pos, self.end) <= self.MIN_DIST:
             if last_vertex != self.end:
                 if self.end in self.a_list:
                     if last_vertex not in self.a_list[self.end]:
-                        self.explored_links[self.end] += 1
-                        self.explored_links[last_vertex] += 1
-                    self.a_list[last_vertex].add(self.end)
-                    self.a_list[self.end].add(last_vertex)
+                        self.explore_link(self.ids[self.end])
+                        self.explore_link(last_id)
+                    self.add_edge(last_vertex, self.end)
                 else:
-                    self.a_list[last_vertex].add(self.end)
-                    self.a_list[self.end] = {last_vertex}
-                    self.num_links[self.end] = len(link_angles)
-                    self.explored_links[self.end] = 1
-                    self.explored_links[last_vertex] += 1
+                    self.add_vertex(self.end, len(link_angles), 1)
+                    self.explore_link(last_id)
+                    self.add_edge(last_vertex, self.end)
             return self.end
         elif math.dist(pos, last_vertex) <= self.MIN_DIST: # If we are at the same vertex.
             if is_discovered:
@@ -220,11 +301,9 @@ class MazeTracker:
         else:
             near_v = self.find_vertex(pos)
             if near_v == None:
-                self.a_list[last_vertex].add(pos)
-                self.a_list[pos] = {last_vertex}
-                self.num_links[pos] = len(link_angles)
-                self.explored_links[pos] = 1
-                self.explored_links[last_vertex] += 1
+                self.add_vertex(pos, len(link_angles), 1)
+                self.explore_link(last_id)
+                self.add_edge(last_vertex, pos)
                 return pos
             else:
                 if is_discovered:
@@ -233,52 +312,49 @@ class MazeTracker:
                     this_pos = (round((near_v[0] + pos[0]) / 2, 3), round((near_v[1] + pos[1]) / 2, 3))
                     self.replace_vertex(near_v, this_pos)
                 if last_vertex not in self.a_list[this_pos]:
-                    self.explored_links[this_pos] += 1
-                    self.explored_links[last_vertex] += 1
-                self.a_list[last_vertex].add(this_pos)
-                self.a_list[this_pos].add(last_vertex)
+                    self.explore_link(self.ids[this_pos])
+                    self.explore_link(last_id)
+                self.add_edge(last_vertex, this_pos)
                 return this_pos
     
     # Navigate during the discovery phase. Also apply an exit mark.
     def discovery_navigate(self, pos, link_angles):
         self.pp_next = None
-        if self.num_links[pos] != len(link_angles):
-            print('!!! Warning: current number of links (' + str(len(link_angles)) + ') does not match previously found number of links (' + str(self.num_links[pos]) + ').')
+        i = self.ids[pos]
+        if self.num_links[i] != len(link_angles):
+            print('!!! Warning: current number of links (' + str(len(link_angles)) + ') does not match previously found number of links (' + str(self.num_links[i]) + ').')
             # Assume that the greater number of links is correct, for safety.
-            if len(link_angles) > self.num_links[pos]:
-                self.num_links[pos] = len(link_angles)
-        assert self.explored_links[pos] == len(self.a_list[pos])
-        if self.explored_links[pos] > self.num_links[pos]:
+            if len(link_angles) > self.num_links[i]:
+                self.num_links[i] = len(link_angles)
+                self.update_frontier(i)
+        assert self.explored_links[i] == len(self.a_list[pos])
+        if self.explored_links[i] > self.num_links[i]:
             print('!!! Warning: number of explored links exceeded total number of links.')
-        if self.explored_links[pos] >= self.num_links[pos]:
-            tree, path, prev = self.dijkstra(pos)
-            min_dist = math.inf
-            min_pos = None
-            for v in self.a_list:
-                if self.explored_links[v] < self.num_links[v] and tree[v] < min_dist:
-                    min_dist = tree[v]
-                    min_pos = v
-            if min_pos == None:
+        if self.explored_links[i] >= self.num_links[i]:
+            # Head for the nearest vertex with unexplored links, found by searching until the first one is settled.
+            path = []
+            if len(self.frontier) > 0: # Otherwise there is nothing left to search for.
+                tree, path, prev = self.dijkstra(pos, targets={self.positions[j] for j in self.frontier})
+            if len(path) == 0:
                 print('RANDOM')
-                return random.random() * 360
+                return self.rng.random() * 360
             else:
-                tree, path, prev = self.dijkstra(pos, min_pos)
                 target_pos = path[1]
                 self.pp_next = target_pos
                 diff = (target_pos[0] - pos[0], pos[1] - target_pos[1])
                 target_angle = (90 - math.degrees(math.atan2(diff[1], diff[0]))) % 360
-                if len(link_angles) == self.num_links[pos]:
+                if len(link_angles) == self.num_links[i]:
                     target_link = 0
-                    for i in range(len(link_angles)):
-                        if abs(self.mod_diff(link_angles[i], target_angle, 360)) < abs(self.mod_diff(link_angles[target_link], target_angle, 360)):
-                            target_link = i
+                    for j in range(len(link_angles)):
+                        if abs(self.mod_diff(link_angles[j], target_angle, 360)) < abs(self.mod_diff(link_angles[target_link], target_angle, 360)):
+                            target_link = j
                     # avg_angle = (target_angle + link_angles[target_link]) / 2
                     return self.mod_avg(target_angle, link_angles[target_link], 360)
                 else:
                     return target_angle
-        elif len(link_angles) < self.num_links[pos]:
+        elif len(link_angles) < self.num_links[i]:
             print('RANDOM')
-            return random.random() * 360
+            return self.rng.random() * 360
         else:
             unexplored_angles = []
             for angle in link_angles:
@@ -286,11 +362,13 @@ class MazeTracker:
             for v in self.a_list[pos]:
                 diff = (v[0] - pos[0], pos[1] - v[1])
                 true_angle = (90 - math.degrees(math.atan2(diff[1], diff[0]))) % 360
+                # Only match links not yet matched to another neighbour, as in a maze with loops two neighbours can be
+                # closest to the same link.
                 closest_link = 0
-                for i in range(len(link_angles)):
-                    if abs(self.mod_diff(link_angles[i], true_angle, 360)) < abs(self.mod_diff(link_angles[closest_link], true_angle, 360)):
-                        closest_link = i
-                unexplored_angles.remove(link_angles[closest_link])
+                for j in range(len(unexplored_angles)):
+                    if abs(self.mod_diff(unexplored_angles[j], true_angle, 360)) < abs(self.mod_diff(unexplored_angles[closest_link], true_angle, 360)):
+                        closest_link = j
+                unexplored_angles.pop(closest_link)
             return unexplored_angles[0]
     
     # Navigate after the discovery phase using A* search.
@@ -311,7 +389,7 @@ class MazeTracker:
     # Generate the shortest path from start to robot's position, for the front-end to display
     # while the robot is still in the discovery phase.
     def generate_partial_path(self, disc_pos, cont_pos):
-        self.pp_tree, self.external_path, self.pp_prev = self.dijkstra(self.start, disc_pos)
+        self.external_path = [self.positions[i] for i in self.paths.path(self.ids[disc_pos])]
         self.external_path.append(cont_pos)
     
     # Update the external path with the robot's current position.
@@ -320,21 +398,22 @@ class MazeTracker:
             self.external_path.pop()
             self.external_path.append(pos)
         else:
-            dist_1 = self.pp_tree[self.prev_vertex] + math.dist(self.prev_vertex, pos)
-            dist_2 = self.pp_tree[self.pp_next] + math.dist(self.pp_next, pos)
+            dist_1 = self.paths.distance(self.ids[self.prev_vertex]) + math.dist(self.prev_vertex, pos)
+            dist_2 = self.paths.distance(self.ids[self.pp_next]) + math.dist(self.pp_next, pos)
             if dist_1 < dist_2 or self.external_path[-2] == self.pp_next:
                 self.external_path.pop()
                 self.external_path.append(pos)
             else:
-                self.external_path.pop()
-                self.external_path.pop()
+                # The robot is nearer the start through the next vertex, which in a maze with loops need not be the
+                # vertex before the last one on the path.
+                self.external_path = [self.positions[i] for i in self.paths.path(self.ids[self.pp_next])]
                 self.external_path.append(pos)
 
     # Test to see if we have discovered enough of the maze to determine the shortest path.
     def enough_discovered(self):
-        dist_tree, path, prev = self.dijkstra(self.start, self.end)
-        for v in self.a_list:
-            if self.explored_links[v] < self.num_links[v] and dist_tree[v] + math.dist(v, self.end) < dist_tree[self.end]:
+        end_dist = self.paths.distance(self.ids[self.end])
+        for j in self.frontier:
+            if self.paths.distance(j) + math.dist(self.positions[j], self.end) < end_dist:
                 # If there could exist a shorter path to the end via this vertex.
                 return False
         print('Sufficient portion of maze discovered!')
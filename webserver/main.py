@@ -4,7 +4,7 @@ from fastapi.middleware.cors import CORSMiddleware
 
 sys.path.append("./webserver")
 
-from routers import frontend, rover, ping
+from routers import frontend, rover, ping, bitmap
 from beacon_state import get_beacon_state, BeaconState
 from database import db
 
@@ -21,6 +21,7 @@ app.add_middleware(
 app.include_router(frontend.router)
 app.include_router(rover.router)
 app.include_router(ping.router)
+app.include_router(bitmap.router)
 
 @app.get("/")
 def index():
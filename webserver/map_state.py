@@ -0,0 +1,54 @@
+import threading
+from collections import OrderedDict
+
+class MapState:
+    CACHE_SIZE = 1024 # The maximum number of rendered tiles kept.
+
+    def __init__(self):
+        self.bitmap = None
+        self.generation = 0 # Incremented whenever a different bitmap is served.
+        self.cache = OrderedDict() # Rendered PNG tiles, keyed by generation, level, position and tile version.
+        self.lock = threading.Lock()
+
+    def set_bitmap(self, bitmap):
+        with self.lock:
+            self.bitmap = bitmap
+            self.generation += 1
+            self.cache.clear()
+
+    # The token clients use to tell whether the map has changed. It includes the generation, since every new bitmap
+    # restarts its version at 0. The caller must hold the lock.
+    def get_version(self):
+        return f"{self.generation}-{self.bitmap.version}"
+
+    def get_info(self):
+        with self.lock:
+            if self.bitmap is None:
+                return None
+            bitmap = self.bitmap
+            levels = []
+            for level in range(bitmap.PYRAMID_LEVELS):
+                scale = bitmap.PYRAMID_SCALE ** level
+                tiles_x, tiles_y = bitmap.get_tile_counts(level)
+                width, height = bitmap.levels[level].shape
+                levels.append({"level": level, "resolution": bitmap.PIXEL_RES * scale, "width": width, "height": height, "tiles_x": tiles_x, "tiles_y": tiles_y})
+            return {"version": self.get_version(), "tile_size": bitmap.TILE_SIZE, "levels": levels}
+
+    # Returns the tile's ETag and PNG, rendering it only if it has changed since it was last cached.
+    def get_tile(self, level: int, tx: int, ty: int):
+        with self.lock:
+            if self.bitmap is None:
+                return None
+            version = self.bitmap.get_tile_version(level, tx, ty)
+            key = (self.generation, level, tx, ty, version)
+            png = self.cache.get(key)
+            if png is None:
+                png = self.bitmap.render_tile(level, tx, ty)
+                self.cache[key] = png
+                if len(self.cache) > self.CACHE_SIZE:
+                    self.cache.popitem(last=False)
+            else:
+                self.cache.move_to_end(key)
+            return f'"{key[0]}-{version}"', png
+
+map_state = MapState()
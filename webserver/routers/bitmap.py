@@ -0,0 +1,28 @@
+from fastapi import APIRouter, HTTPException, Request, Response
+from map_state import map_state
+
+router = APIRouter()
+
+
+@router.get("/map/info")
+def get_map_info():
+    info = map_state.get_info()
+    if info is None:
+        raise HTTPException(status_code=404, detail="No map available")
+    return info
+
+
+@router.get("/map/tiles/{level}/{tx}/{ty}.png")
+def get_map_tile(level: int, tx: int, ty: int, request: Request):
+    if map_state.bitmap is None:
+        raise HTTPException(status_code=404, detail="No map available")
+    if not 0 <= level < map_state.bitmap.PYRAMID_LEVELS:
+        raise HTTPException(status_code=404, detail="Invalid zoom level")
+    try:
+        etag, png = map_state.get_tile(level, tx, ty)
+    except IndexError:
+        raise HTTPException(status_code=404, detail="Invalid tile")
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=png, media_type="image/png", headers=headers)
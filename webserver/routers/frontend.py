@@ -1,6 +1,8 @@
 import sys
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
 from connection_manager import frontend_manager, rover_manager
+from map_state import map_state
+from sim_runner import SimRunner
 from webserver.beacon_state import get_beacon_state, BeaconState
 from database import db
 import asyncio
@@ -12,6 +14,8 @@ from maze_sim import MazeSim
 
 router = APIRouter()
 
+sim_runner = None # The simulation currently running, if any.
+
 
 @router.websocket("/ws/frontend")
 async def websocket_frontend(websocket: WebSocket):
@@ -69,30 +73,48 @@ async def handle_manual_message(
     elif command == "sim":
         print("Maze no: ", message_parts[1])
         cycle_step = 5
-        sim = MazeSim(int(message_parts[1]), bool(message_parts[2]), cycle_step)
+        loop = asyncio.get_running_loop()
+        sim = await loop.run_in_executor(None, MazeSim, int(message_parts[1]), bool(message_parts[2]), cycle_step)
         asyncio.create_task(update_simulation(websocket, sim))
     else:
         await rover_manager.send_data({"type": "movement", "command": message})
         await frontend_manager.send_log("Manual: " + message)
 
 
+# Stream frames from a simulation stepped in a worker thread, so that the event loop stays free for rover traffic.
+# Starting a new simulation stops the previous one.
 async def update_simulation(websocket: WebSocket, sim: MazeSim):
+    global sim_runner
+    old_runner = sim_runner
+    runner = sim_runner = SimRunner(sim)
+    if old_runner is not None:
+        old_runner.stop()
+
+    # The old worker may hold the map lock for a whole step, so wait for it off the event loop.
+    def replace_bitmap():
+        if old_runner is not None:
+            old_runner.join()
+        if not runner.stopped.is_set():
+            map_state.set_bitmap(sim.manager.bitmap)
+
+    await asyncio.get_running_loop().run_in_executor(None, replace_bitmap)
+    if runner.stopped.is_set(): # Replaced by a newer simulation while waiting.
+        return
     await frontend_manager.send_log("Simulation started")
-    while sim.update():
-        edges = sim.manager.get_edges()
-        path = sim.manager.get_path()
-        robot_pos = sim.manager.get_pos()
-        robot_angle = sim.manager.get_angle()
-
-        await websocket.send_json(
-            {
-                "type": "maze",
-                "edges": edges,
-                "path": path,
-                "rover": {"pos": robot_pos, "angle": robot_angle},
-            }
-        )
-
-        await asyncio.sleep(0.1)
-
-    await frontend_manager.send_log("Simulation complete")
+    runner.start()
+    try:
+        while True:
+            frame = await runner.next_frame()
+            if frame is None or runner.stopped.is_set():
+                break
+            await websocket.send_json(frame)
+            await asyncio.sleep(0.1)
+    finally:
+        runner.stop()
+        if sim_runner is runner:
+            sim_runner = None
+
+    if runner.error is not None:
+        await frontend_manager.send_log("Simulation failed: " + str(runner.error))
+    elif runner.finished:
+        await frontend_manager.send_log("Simulation complete")
@@ -0,0 +1,70 @@
+import asyncio
+import threading
+from map_state import map_state
+
+# Steps a simulation in a worker thread so that it never blocks the event loop, and streams the frames to an async
+# queue. The queue is bounded, so the simulation only runs a few frames ahead of whoever consumes them.
+class SimRunner:
+    QUEUE_SIZE = 4 # The maximum number of frames waiting to be sent.
+
+    def __init__(self, sim):
+        self.sim = sim
+        self.frames = asyncio.Queue(self.QUEUE_SIZE) # Frames to send, followed by None once the simulation ends.
+        self.stopped = threading.Event()
+        self.loop = None
+        self.thread = None
+        self.error = None # The exception that ended the simulation, if any.
+        self.finished = False # Whether the simulation ran to the end, rather than being stopped.
+
+    # Start the worker thread. Must be called from the event loop.
+    def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    # Stop the simulation. Must be called from the event loop.
+    def stop(self):
+        self.stopped.set()
+        while not self.frames.empty(): # Unblock the worker if it is waiting for space in the queue.
+            self.frames.get_nowait()
+        self.frames.put_nowait(None) # Wake the consumer if it is waiting for a frame.
+
+    # Wait for the worker thread to exit after stop(). Must not be called from the event loop, which the worker may be
+    # waiting on to hand over a frame.
+    def join(self):
+        if self.thread is not None:
+            self.thread.join()
+
+    # Wait for the next frame, or None once the simulation has ended.
+    async def next_frame(self):
+        return await self.frames.get()
+
+    # Must be called with the map lock held.
+    def get_frame(self):
+        return {
+            "type": "maze",
+            "edges": self.sim.manager.get_edges(),
+            "path": self.sim.manager.get_path(),
+            "rover": {"pos": self.sim.manager.get_pos(), "angle": self.sim.manager.get_angle()},
+            "map_version": map_state.get_version(),
+        }
+
+    # Hand a frame to the event loop, waiting while the queue is full.
+    def put(self, frame):
+        asyncio.run_coroutine_threadsafe(self.frames.put(frame), self.loop).result()
+
+    # The worker thread. The map lock is held while stepping, so tiles are never rendered from a half-updated bitmap.
+    def run(self):
+        try:
+            while not self.stopped.is_set():
+                with map_state.lock:
+                    running = self.sim.update()
+                    frame = self.get_frame() if running else None
+                if frame is None:
+                    self.finished = True
+                    break
+                self.put(frame)
+        except Exception as e:
+            self.error = e
+        if not self.stopped.is_set():
+            self.put(None)